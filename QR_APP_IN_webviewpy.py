@@ -1,85 +1,465 @@
+import hashlib
 import io
-import base64
 import os
+import re
+import secrets
 import urllib.parse
-from flask import Flask, request, render_template_string, send_file
+from concurrent.futures import Future
+from flask import Flask, Response, g, jsonify, redirect, request, send_file, stream_with_context
 import qrcode
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image
 import webview
 from threading import Thread
+import qr_serve
+
+import bg_upload
+import qr_encoder
+import qr_metrics
+import qr_payload
+import qr_render
+import qr_svg
+import qr_timing
+import render_cache
+import render_farm
+import scan_log
+import session_store
+import short_links
+import zip_stream
 
 # --- Flask App Setup ---
 app = Flask(__name__)
 
 # --- QR Code Config (defaults; can be overridden by form) ---
 DEFAULT_QR_BOX_SIZE = 6
+MAX_QR_BOX_SIZE = 20  # the form's modalBoxSize max
 DEFAULT_QR_ERROR = qrcode.constants.ERROR_CORRECT_L
+ERROR_LEVELS = {
+    'L': qrcode.constants.ERROR_CORRECT_L,
+    'M': qrcode.constants.ERROR_CORRECT_M,
+    'Q': qrcode.constants.ERROR_CORRECT_Q,
+    'H': qrcode.constants.ERROR_CORRECT_H
+}
 
-USER_BG_PATH = 'user_bg.png'
+# --- Metrics (served at /metrics in the Prometheus text format) ---
+# qr_serve sets QRGEN_METRICS_DIR for multi-worker runs so every worker's numbers are aggregated
+metrics = qr_metrics.Registry(os.environ.get('QRGEN_METRICS_DIR', ''))
+REQUESTS = metrics.counter("qrgen_requests_total", "HTTP requests by route and status.", ("route", "status"))
+REQUEST_SECONDS = metrics.histogram("qrgen_request_duration_seconds", "Request latency by route.", ("route",))
+STAGE_SECONDS = metrics.histogram(
+    "qrgen_render_stage_seconds", "Time spent per card pipeline stage.", ("stage",), qr_metrics.STAGE_BUCKETS
+)
+OUTPUT_BYTES = metrics.histogram(
+    "qrgen_output_bytes", "Size of image and archive responses.", ("format",), qr_metrics.BYTE_BUCKETS
+)
+UPLOAD_BYTES = metrics.histogram(
+    "qrgen_background_upload_bytes", "Size of accepted background uploads.", (), qr_metrics.BYTE_BUCKETS
+)
+UPLOADS_REJECTED = metrics.counter("qrgen_background_uploads_rejected_total", "Background uploads that failed validation.")
+CACHE_LOOKUPS = metrics.counter("qrgen_cache_lookups_total", "Cache lookups by cache and result.", ("cache", "result"))
+RENDERS_IN_FLIGHT = metrics.gauge("qrgen_renders_in_flight", "Card renders currently running.")
+PROCESS_MEMORY = metrics.gauge(
+    "qrgen_process_resident_memory_bytes", "Resident memory of each server process.", mode="pid"
+)
+
+def _cache_hit_ratio(merged):
+    lookups = merged["qrgen_cache_lookups_total"]
+    ratios = {}
+    for (cache, result), count in lookups.items():
+        if result == "hit":
+            total = count + lookups.get((cache, "miss"), 0)
+            ratios[(cache,)] = count / total if total else 0.0
+    return ratios
+
+metrics.derived_gauge("qrgen_cache_hit_ratio", "Share of cache lookups that were hits.", ("cache",), _cache_hit_ratio)
+
+# Uploaded backgrounds are stored per content hash; each session remembers its own
+BACKGROUND_STORE_DIR = 'backgrounds'
+# Scaled copies of stored backgrounds go up to the largest card the form allows, so none is upscaled
+LARGEST_QR_SIDE = (4 * 40 + 17 + 2 * 4) * MAX_QR_BOX_SIZE  # version 40 with the default 4-module border
+BACKGROUND_STORE_MAX_SIDE = max(qr_render.card_size(LARGEST_QR_SIDE, LARGEST_QR_SIDE))
+background_store = bg_upload.BackgroundStore(
+    BACKGROUND_STORE_DIR, max_side=BACKGROUND_STORE_MAX_SIDE, on_accept=lambda key, size: UPLOAD_BYTES.observe(size)
+)
 
 BACKGROUND_IMAGE_PATH = 'back.png'
 FONT_PATH = 'Poppins-Bold.ttf'
 
-last_qr_data = None
-saved_input_data = {}
-
-# --- Add Custom Graphics Function ---
-def add_custom_graphics(qr_img: Image.Image, custom_text="") -> Image.Image:
-    QR_WIDTH, QR_HEIGHT = qr_img.size
-    PADDING = 30
-    TEXT_HEIGHT = 40
-    CARD_WIDTH = QR_WIDTH + (2 * PADDING)
-    CARD_HEIGHT = QR_HEIGHT + (2 * PADDING) + TEXT_HEIGHT
-
-    card = Image.new('RGB', (CARD_WIDTH, CARD_HEIGHT), color='#FFFFFF')
-    bg_path_to_use = None
-    if os.path.exists(USER_BG_PATH):
-        bg_path_to_use = USER_BG_PATH
-    elif os.path.exists(BACKGROUND_IMAGE_PATH):
-        bg_path_to_use = BACKGROUND_IMAGE_PATH
+# --- Per-Session Generation State ---
+# Set QRGEN_SESSION_DB to a SQLite path when running more than one worker process
+SESSION_DB_PATH = os.environ.get('QRGEN_SESSION_DB', '')
+SESSION_TTL = 2 * 3600
+SESSION_MAX_ENTRIES = 10000
+SESSION_COOKIE = 'qrgen_sid'
+sessions = session_store.open_store(SESSION_DB_PATH, ttl=SESSION_TTL, max_entries=SESSION_MAX_ENTRIES)
+
+def _session_id():
+    sid = request.cookies.get(SESSION_COOKIE, '')
+    if not re.fullmatch(r'[A-Za-z0-9_-]{16,64}', sid):
+        sid = g.get('new_session_id') or secrets.token_urlsafe(24)
+        g.new_session_id = sid
+    return sid
+
+def load_state() -> dict:
+    return sessions.get(_session_id()) or {}
+
+def save_state(state: dict):
+    sid = _session_id()
+    sessions.set(sid, state)
+    g.new_session_id = sid  # refresh the cookie lifetime along with the stored TTL
+
+@app.after_request
+def _set_session_cookie(response):
+    sid = g.pop('new_session_id', None)
+    if sid:
+        response.set_cookie(SESSION_COOKIE, sid, max_age=SESSION_TTL, httponly=True, samesite='Lax')
+    return response
+
+# --- Request Timing ---
+# Every response carries a Server-Timing header with the card pipeline's stages. Requests slower
+# than QRGEN_SLOW_MS (0 = off) are logged with their inputs as JSON lines to QRGEN_SLOW_LOG (or stderr).
+SLOW_REQUEST_MS = float(os.environ.get('QRGEN_SLOW_MS') or 0)
+slow_request_log = qr_timing.SlowRequestLog(os.environ.get('QRGEN_SLOW_LOG', ''))
+SLOW_LOG_MAX_VALUE = 500  # characters kept per logged input value
+
+@app.before_request
+def _start_timing():
+    metrics.ensure_flusher()
+    g.timing = qr_timing.start()
+
+@app.after_request
+def _finish_timing(response):
+    timing = g.pop('timing', None)
+    if timing is None:
+        return response
+    summary = _request_summary(response)
+    if response.is_streamed:
+        # The body (e.g. the ZIP export's renders) is produced after this hook returns: the header can
+        # only carry the stages so far, the metrics and slow log are recorded once the response closes
+        response.headers['Server-Timing'] = qr_timing.server_timing_header(timing, timing.elapsed())
+        if SLOW_REQUEST_MS:
+            summary["inputs"] = _request_inputs()  # the request is gone by then
+        response.call_on_close(lambda: _record_timing(summary, timing, timing.finish()))
+        return response
+    total = timing.finish()
+    response.headers['Server-Timing'] = qr_timing.server_timing_header(timing, total)
+    _record_timing(summary, timing, total)
+    return response
+
+def _request_summary(response):
+    return {
+        "route": request.endpoint or "unmatched",
+        "path": request.path,
+        "method": request.method,
+        "status": response.status_code,
+        "mimetype": response.mimetype,
+        "content_length": response.content_length,
+    }
 
+def _record_timing(summary, timing, total):
+    _record_metrics(summary, timing, total)
+    if SLOW_REQUEST_MS and total * 1000 >= SLOW_REQUEST_MS:
+        slow_request_log.write({
+            "path": summary["path"],
+            "method": summary["method"],
+            "status": summary["status"],
+            "total_ms": round(total * 1000, 2),
+            "stages_ms": {name: round(seconds * 1000, 2) for name, seconds in timing.stages.items()},
+            "marks": timing.marks,
+            "inputs": summary["inputs"] if "inputs" in summary else _request_inputs(),
+        })
+
+def _record_metrics(summary, timing, total):
+    route = summary["route"]
+    REQUESTS.inc((route, str(summary["status"])))
+    REQUEST_SECONDS.observe(total, (route,))
+    for name, seconds in timing.stages.items():
+        STAGE_SECONDS.observe(seconds, (name,))
+    if summary["content_length"] and summary["mimetype"].startswith(("image/", "application/zip")):
+        OUTPUT_BYTES.observe(summary["content_length"], (summary["mimetype"].split("/")[1],))
+
+def _collect_metrics():
+    for cache_name, cache in (("card", card_cache), ("background", background_cache)):
+        stats = cache.stats()
+        CACHE_LOOKUPS.set_total(stats["hits"], (cache_name, "hit"))
+        CACHE_LOOKUPS.set_total(stats["misses"], (cache_name, "miss"))
+    PROCESS_MEMORY.set(qr_metrics.process_rss_bytes())
+
+metrics.add_collector(_collect_metrics)
+
+def _request_inputs():
+    inputs = {key: value[:SLOW_LOG_MAX_VALUE] for key, value in request.values.items()}
+    for field, upload in request.files.items():
+        inputs[field] = {"filename": upload.filename, "content_type": upload.content_type}
+    return inputs
+
+# --- Card Background ---
+BACKGROUND_RESAMPLE = Image.Resampling.BICUBIC
+background_cache = qr_render.BackgroundCache(max_entries=8, resample=BACKGROUND_RESAMPLE)
+
+def background_fingerprint(user_bg_path=None):
+    if user_bg_path:
+        return background_cache.fingerprint(user_bg_path, BACKGROUND_IMAGE_PATH)
+    return background_cache.fingerprint(BACKGROUND_IMAGE_PATH)
+
+def load_background(card_width, card_height, user_bg_path=None):
+    if user_bg_path:
+        # Decode the stored copy scaled closest to this card, not the full-size upload
+        user_bg_path = background_store.scaled_path(user_bg_path, max(card_width, card_height))
+    fingerprint = background_fingerprint(user_bg_path)
+    if not fingerprint:
+        return None
     try:
-        if bg_path_to_use:
-            bg = Image.open(bg_path_to_use).convert("RGB")
-            bg = bg.resize((CARD_WIDTH, CARD_HEIGHT))
-            card.paste(bg, (0, 0))
-        else:
-            draw = ImageDraw.Draw(card)
-            draw.rectangle([(0, 0), (CARD_WIDTH, CARD_HEIGHT)], fill="#f3f4f6")
+        return background_cache.get(fingerprint, card_width, card_height)
     except Exception:
         # Fallback if image loading fails
-        draw = ImageDraw.Draw(card)
-        draw.rectangle([(0, 0), (CARD_WIDTH, CARD_HEIGHT)], fill="#f3f4f6") 
+        return None
+
+# --- Add Custom Graphics Function ---
+def _compose_card(qr_width, qr_height, paste_qr, custom_text="", user_bg_path=None) -> Image.Image:
+    card_width, card_height = qr_render.card_size(qr_width, qr_height)
+    with qr_timing.stage("background"):
+        background = load_background(card_width, card_height, user_bg_path)
+    with qr_timing.stage("compose"):
+        card = qr_render.new_card(qr_width, qr_height, background)
+    with qr_timing.stage("image"):
+        paste_qr(card)
+
+    text = custom_text if custom_text else qr_render.DEFAULT_LABEL
+    with qr_timing.stage("text"):
+        qr_render.draw_label(card, qr_height, text, FONT_PATH, 16)
+    with qr_timing.stage("compose"):
+        return qr_render.to_image(card)
+
+def add_custom_graphics(qr_img: Image.Image, custom_text="", user_bg_path=None) -> Image.Image:
+    QR_WIDTH, QR_HEIGHT = qr_img.size
+    return _compose_card(
+        QR_WIDTH, QR_HEIGHT, lambda card: qr_render.paste_image(card, qr_img), custom_text, user_bg_path
+    )
 
-    draw = ImageDraw.Draw(card)
-    draw.rectangle(
-        [(PADDING - 1, PADDING - 1), (QR_WIDTH + PADDING + 1, QR_HEIGHT + PADDING + 1)],
-        outline="white", width=2
+def render_qr_card(qr: qrcode.QRCode, custom_text="", user_bg_path=None) -> Image.Image:
+    # Rasterize straight from the module matrix; skips qr.make_image() and the intermediate QR image
+    modules = qr.matrix
+    qr_size = (qr.modules_count + 2 * qr.border) * qr.box_size
+    return _compose_card(
+        qr_size, qr_size,
+        lambda card: qr_render.paste_modules(card, modules, qr.box_size, qr.border),
+        custom_text, user_bg_path
     )
 
-    card.paste(qr_img, (PADDING, PADDING))
+# --- Card Pipeline ---
+def build_qr(encoded_url, box_size, qr_error, mask_pattern=None) -> qr_encoder.QRCode:
+    # mask_pattern pins one of the eight masks; None lets the encoder score them and pick the best
+    with qr_timing.stage("encode"):
+        qr = qr_encoder.QRCode(box_size=box_size, error_correction=qr_error, mask_pattern=mask_pattern)
+        qr.add_data(encoded_url)
+        qr.make(fit=True)
+    return qr
+
+def render_card_image(encoded_url, box_size, qr_error, custom_text="", user_bg_path=None,
+                      mask_pattern=None) -> Image.Image:
+    return render_qr_card(build_qr(encoded_url, box_size, qr_error, mask_pattern), custom_text, user_bg_path)
+
+# PNG output profiles: "fast" for interactive latency, "small" for archives/bandwidth
+PNG_PROFILES = {
+    "fast": {"compress_level": 1},
+    "balanced": {"compress_level": 6},
+    "small": {"compress_level": 9, "optimize": True, "palette": True},
+}
+DEFAULT_PNG_PROFILE = "balanced"
 
-    try:
-        font = ImageFont.truetype(FONT_PATH, 16)
-    except Exception:
-        try:
-            font = ImageFont.truetype("arial.ttf", 16)
-        except Exception:
-            font = ImageFont.load_default()
+def parse_png_profile(profile_raw):
+    profile = str(profile_raw or "").lower()
+    return profile if profile in PNG_PROFILES else DEFAULT_PNG_PROFILE
 
-    text = custom_text if custom_text else "Scan Me!"
-    text_color = "#1e3a8a"
+def encode_png(final_card: Image.Image, profile=DEFAULT_PNG_PROFILE) -> bytes:
+    options = dict(PNG_PROFILES[profile])
+    if options.pop("palette", False):
+        # 1-bit / palette when the card has <= 256 colours (plain cards, bare QR codes)
+        final_card = qr_render.to_palette(final_card) or final_card
+    buf = io.BytesIO()
+    with qr_timing.stage("png"):
+        final_card.save(buf, format="PNG", **options)
+    return buf.getvalue()
+
+# format name -> (PIL format, mimetype); svg is produced by qr_svg, not PIL
+IMAGE_FORMATS = {
+    "png": ("PNG", "image/png"),
+    "jpeg": ("JPEG", "image/jpeg"),
+    "jpg": ("JPEG", "image/jpeg"),
+    "webp": ("WEBP", "image/webp"),
+    "svg": (None, "image/svg+xml"),
+}
+LAYOUTS = ("card", "qr")  # full card, or the bare QR symbol
 
-    text_bbox = draw.textbbox((0, 0), text, font=font)
-    text_width = text_bbox[2] - text_bbox[0]
-    text_x = (CARD_WIDTH - text_width) / 2
-    text_y = QR_HEIGHT + PADDING + (TEXT_HEIGHT - (text_bbox[3] - text_bbox[1])) / 2 + 5
+def encode_image(final_card: Image.Image, fmt, profile=DEFAULT_PNG_PROFILE) -> bytes:
+    pil_format, _ = IMAGE_FORMATS[fmt]
+    if pil_format == "PNG":
+        return encode_png(final_card, profile)
+    buf = io.BytesIO()
+    with qr_timing.stage(pil_format.lower()):
+        final_card.save(buf, format=pil_format, quality=90)
+    return buf.getvalue()
+
+def render_output(encoded_url, box_size, qr_error, custom_text="", fmt="png", layout="card",
+                  profile=DEFAULT_PNG_PROFILE, user_bg_path=None, mask_pattern=None) -> tuple[bytes, int]:
+    # Returns (data, QR version)
+    with RENDERS_IN_FLIGHT.track():
+        qr = build_qr(encoded_url, box_size, qr_error, mask_pattern)
+        if fmt == "svg":
+            modules = qr.matrix
+            if layout == "qr":
+                with qr_timing.stage("svg"):
+                    return qr_svg.qr_svg(modules, qr.box_size, qr.border).encode(), qr.version
+            qr_size = (qr.modules_count + 2 * qr.border) * qr.box_size
+            with qr_timing.stage("background"):
+                background = load_background(*qr_render.card_size(qr_size, qr_size), user_bg_path)
+            text = custom_text if custom_text else qr_render.DEFAULT_LABEL
+            with qr_timing.stage("svg"):
+                return qr_svg.card_svg(modules, qr.box_size, qr.border, text, background).encode(), qr.version
+        if layout == "qr":
+            return encode_image(qr_render.qr_image(qr.matrix, qr.box_size, qr.border), fmt, profile), qr.version
+        return encode_image(render_qr_card(qr, custom_text, user_bg_path), fmt, profile), qr.version
+
+# --- Card Specs (batch / ZIP / API requests) ---
+SPEC_FIELDS = (
+    "name", "message", "copy_data", "image_url", "text_key",
+    "link1", "link2", "link3", "custom_text", "box_size", "error_level", "mask",
+)
+
+def parse_box_size(box_size_raw):
+    try:
+        box_size = int(box_size_raw) if box_size_raw else DEFAULT_QR_BOX_SIZE
+        if box_size < 1: box_size = DEFAULT_QR_BOX_SIZE
+    except Exception:
+        box_size = DEFAULT_QR_BOX_SIZE
+    # Same range as the form; larger values cost seconds and gigabytes per card
+    return min(box_size, MAX_QR_BOX_SIZE)
 
-    draw.text((text_x, text_y), text, fill=text_color, font=font)
-    return card
+def parse_mask(mask_raw):
+    # "0".."7" pins a QR mask pattern; anything else means automatic selection
+    try:
+        mask = int(mask_raw)
+    except (TypeError, ValueError):
+        return None
+    return mask if mask in qr_encoder.MASK_PATTERNS else None
+
+def normalize_spec(row) -> dict:
+    # Coerce a raw row/JSON object into the saved_input_data shape the form produces
+    spec = {field: str(row.get(field) or "").strip() for field in SPEC_FIELDS}
+    spec["box_size"] = parse_box_size(spec["box_size"])
+    spec["error_level"] = spec["error_level"].upper()
+    spec["mask"] = parse_mask(row.get("mask"))  # 0 is a valid mask, so not via the string coercion above
+    return spec
+
+def card_filename(index, spec, ext="png"):
+    slug = re.sub(r"[^A-Za-z0-9_-]+", "_", spec.get("name", "")).strip("_")[:40] or "qrcode"
+    return f"{index:05d}_{slug}.{ext}"
+
+def render_spec(spec, fmt="png", layout="card", profile=DEFAULT_PNG_PROFILE):
+    # Render a normalized spec without touching the interactive card cache; returns (encoded_url, data, version)
+    encoded_url = generate_target_url(spec)
+    qr_error = ERROR_LEVELS.get(spec["error_level"], DEFAULT_QR_ERROR)
+    data, version = render_output(
+        encoded_url, spec["box_size"], qr_error, spec["custom_text"], fmt, layout, profile,
+        mask_pattern=spec["mask"]
+    )
+    return encoded_url, data, version
+
+# --- Render Farm (optional) ---
+# QRGEN_RENDER_FARM=N renders on N pre-warmed worker processes instead of the request thread, so
+# rendering scales with cores despite the GIL; 0 renders in-process. warm_up() starts the workers.
+RENDER_FARM_WORKERS = int(os.environ.get('QRGEN_RENDER_FARM') or 0)
+RENDER_FARM_MAX_JOBS = 500  # renders per worker process before it is replaced
+RENDER_FARM_TIMEOUT = 30  # seconds a request waits for room in the farm's queue before a 503
+
+def _warm_up_render_worker():
+    # Runs in each farm worker (a fresh import of this module) before it takes jobs; a worker never
+    # starts a farm of its own
+    warm_up_renderer()
+
+render_farm_pool = render_farm.RenderFarm(
+    RENDER_FARM_WORKERS, max_jobs=RENDER_FARM_MAX_JOBS, initializer=_warm_up_render_worker
+) if RENDER_FARM_WORKERS else None
+
+def _run_timed(func, *args):
+    # Runs in a farm worker: the job's stages, marks and background-cache lookups travel back after the
+    # result tuple's own items (the bytes item stays top-level, so it still goes through shared memory)
+    timing = qr_timing.start()
+    before = background_cache.stats()
+    try:
+        result = func(*args)
+    finally:
+        timing.finish()
+    after = background_cache.stats()
+    report = (timing.stages, timing.marks, after["hits"] - before["hits"], after["misses"] - before["misses"])
+    return (*result, report)
+
+def _merge_render_report(result):
+    # Fold a _run_timed report into this request's timing and this process's cache stats
+    *result, (stages, marks, hits, misses) = result
+    qr_timing.merge(stages, marks)
+    background_cache.count_lookups(hits, misses)
+    return tuple(result)
+
+def dispatch_render(func, *args):
+    # Run render_output/render_spec on the farm when one is configured, else in this thread
+    if render_farm_pool is None:
+        return func(*args)
+    with qr_timing.stage("farm"), RENDERS_IN_FLIGHT.track():
+        result = render_farm_pool.submit(_run_timed, func, *args, timeout=RENDER_FARM_TIMEOUT).result()
+    return _merge_render_report(result)
+
+def render_specs(specs, fmt="png", layout="card", profile=DEFAULT_PNG_PROFILE):
+    # One Future per spec, in order; on the farm, later specs render while earlier ones are consumed
+    jobs = ((spec, fmt, layout, profile) for spec in specs)
+    if render_farm_pool is not None:
+        for farm_future in render_farm_pool.submit_all(_run_timed, ((render_spec, *job) for job in jobs)):
+            future = Future()
+            try:
+                future.set_result(_merge_render_report(farm_future.result()))
+            except Exception as e:
+                future.set_exception(e)
+            yield future
+        return
+    for job in jobs:
+        future = Future()
+        try:
+            future.set_result(render_spec(*job))
+        except Exception as e:
+            future.set_exception(e)
+        yield future
+
+@app.errorhandler(render_farm.FarmBusy)
+def _render_farm_busy(error):
+    return "Too many renders in progress, try again shortly", 503, {"Retry-After": "2"}
+
+# --- Rendered Card Cache (shared by /generate_qr and /download_qr) ---
+RENDER_CACHE_MAX_BYTES = 64 * 1024 * 1024
+card_cache = render_cache.RenderCache(max_bytes=RENDER_CACHE_MAX_BYTES)
+
+def render_card_png(encoded_url, box_size, qr_error, custom_text="",
+                    profile=DEFAULT_PNG_PROFILE, user_bg_path=None, mask_pattern=None) -> render_cache.RenderedCard:
+    background = background_fingerprint(user_bg_path)
+    key = render_cache.make_key(encoded_url, box_size, qr_error, custom_text, (background, profile, mask_pattern))
+    card = card_cache.get(key)
+    qr_timing.mark("card-cache", "miss" if card is None else "hit")
+    if card is not None:
+        return card
+
+    png, version = dispatch_render(
+        render_output, encoded_url, box_size, qr_error, custom_text, "png", "card", profile, user_bg_path, mask_pattern
+    )
+    return card_cache.put(key, png, version=version)
 
 # --- URL Builder ---
-def generate_target_url(d):
+# The compact "p" payload needs the qr_payload decoder on the landing page that `base` points to; keep
+# QRGEN_COMPACT_URLS off until the hosted page ships it
+COMPACT_TARGET_URLS = os.environ.get('QRGEN_COMPACT_URLS', '') == '1'
+
+def generate_target_url(d, compact=None):
+    # compact: all fields in one qr_payload "p" value (decoded by the landing page), when that is shorter
+    if compact is None:
+        compact = COMPACT_TARGET_URLS
     base = "https://abilash-nickal.github.io/QR-cod-generator/my_detail_moder_UI.html"
     params = {
         "name": d.get("name", ""),
@@ -92,7 +472,28 @@ def generate_target_url(d):
         "l3": d.get("link3", "")
     }
     params = {k: v for k, v in params.items() if v}
-    return f"{base}?{urllib.parse.urlencode(params)}"
+    query = urllib.parse.urlencode(params)
+    if compact and params:
+        packed = "p=" + qr_payload.encode(params)
+        if len(packed) < len(query):
+            query = packed
+    return f"{base}?{query}"
+
+# --- Short Links ---
+# LINK_MODE "short": the interactive card encodes <base>/R/<code>, which redirects to the landing URL.
+# The code stays with the session, so later edits re-point it and the printed QR keeps working.
+LINK_MODE = os.environ.get('QRGEN_LINK_MODE', 'direct')
+SHORT_LINK_DB = os.environ.get('QRGEN_SHORT_LINK_DB', 'qrgen_links.db')
+SHORT_LINK_BASE = os.environ.get('QRGEN_SHORT_LINK_BASE', '')  # defaults to the requested host
+short_link_store = short_links.ShortLinkStore(SHORT_LINK_DB)
+# Every redirect is counted as a scan: buffered in memory, written to SQLite in batches
+scan_recorder = scan_log.ScanRecorder(os.environ.get('QRGEN_SCAN_DB', SHORT_LINK_DB))
+
+def short_link_for(code, target_url) -> str:
+    # Re-point the session's existing code, or create one; returns the code
+    if code and short_link_store.update(code, target_url):
+        return code
+    return short_link_store.create(target_url)
 
 # ----------------------------------------------------------------------------------------------------
 # HTML TEMPLATE — modified: glass dropdown, modal, 3-dot menu, boxes for box_size/error_level
@@ -109,194 +510,7 @@ HTML_TEMPLATE = """
 <script type="module" src="https://unpkg.com/@splinetool/viewer@1.12.6/build/spline-viewer.js"></script>
 <link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/4.7.0/css/font-awesome.min.css">
 <link href="https://fonts.googleapis.com/css2?family=Poppins:wght@400;700&display=swap" rel="stylesheet">
-<style>
-:root{
-  --glass-bg: rgba(255,255,255,0.06);
-  --glass-border: rgba(255,255,255,0.12);
-  --accent: #4f46e5;
-}
-html,body{height:100%;
-    font-family:Inter,sans-serif;
-    color:#031220;display:flex;
-    align-items:center;
-    justify-content:center;
-    background:#080338;
-    overflow:hidden;}
-spline-viewer {
-    position: fixed; /* Fixes it to the viewport */
-    top: 0;
-    left: 0;
-    right: 0;
-    bottom: 0;
-    width: 100%;
-    height: 100%;
-    z-index: 0; /* Pushes it behind the main content */
-}
-.glass{background:linear-gradient(135deg, rgba(243, 243, 243, 0.02), rgba(252, 252, 252, 0.01));
-border:1px solid var(--glass-border);backdrop-filter:
-blur(14px) saturate(120%);
--webkit-backdrop-filter:blur(14px) saturate(120%);
-box-shadow:0 10px 40px rgba(0, 0, 0, 0.6);
-border-radius:20px;padding:24px;}
-.label{color:rgba(220,230,245,0.95);font-weight:600;margin-bottom:6px;display:block;}
-.input, .select {
-  width:100%; padding:10px 12px; border-radius:10px; background:transparent; border:1px solid rgba(255,255,255,0.06);
-  color: #e6eef8; outline:none;
-}
-
-.h1 {
-font-family: 'Poppins', sans-serif;
-font-size:80px;
-font-weight:1000; 
-color:white;
-line-height: 0;
-margin-top: -300px; 
-width: 800px; 
-margin-left: auto;
-margin-right: auto;
-}
-h2 {
-font-family: 'Poppins', sans-serif;
-color:white;
-}
-/* --- Base Styles (Provided) --- */
-.btn-primary{background:linear-gradient(90deg,var(--accent),#6d28d9);border:none;color:white;padding:12px;border-radius:10px;}
-.btn-download{background:linear-gradient(90deg,#059669,#10b981);color:white;padding:10px;border-radius:10px;box-shadow:0 6px 18px rgba(16,185,129,0.18);margin-right: 10px;}
-.btn-link{
-    background:linear-gradient(90deg,#3b82f6,#2563eb);
-    color:white;
-    padding:10px;
-    border-radius:10px;
-    box-shadow:0 6px 18px rgba(37,99,235,0.18);
-    margin-right: 10px;
-    
-    /* Ensure the link acts like a block to accept width */
-    display: inline-block; 
-    
-    /* ADDED: Set the desired width (length) here */
-    width: 180px; 
-    
-    /* ADDED: Center the text/icon inside the button (optional) */
-    text-align: center; 
-}
-/* --- Hover Styles with Glow Added --- */
-.btn-link:hover {
-    background: gold;
-    color: black;
-    /* ADDED: Box shadow for the glow effect */
-    box-shadow: 0 0 15px gold; 
-    /* ADDED: Optional: Smooth transition for the effect */
-    transition: box-shadow 0.3s ease; 
-    
-}
-.btn-primary:hover {
-    background: gold;
-    color: black;
-    /* ADDED: Box shadow for the glow effect */
-    box-shadow: 0 0 15px gold; 
-    /* ADDED: Optional: Smooth transition for the effect */
-    transition: box-shadow 0.3s ease; 
-}
-
-.btn-download:hover {
-    background: gold;
-    color: black;
-    /* ADDED: Box shadow for the glow effect */
-    box-shadow: 0 0 15px gold; 
-    /* ADDED: Optional: Smooth transition for the effect */
-    transition: box-shadow 0.3s ease;
-    
-}
-
-.small-btn:hover {
-    background: gold;
-    color: black;
-    /* ADDED: Box shadow for the glow effect */
-    box-shadow: 0 0 15px gold;
-    /* ADDED: Optional: Smooth transition for the effect */
-    transition: box-shadow 0.3s ease;
-}
-
-/* * NOTE: To make the glow appear smooth, you should also add a 
-* transition property to the base (non-hover) button styles:
-*/
-.btn-primary, .btn-download, .small-btn ,.btn-link {
-    /* ... existing properties ... */
-    transition: background 0.3s, box-shadow 0.3s;
-}
-.small-btn{background:rgba(255,255,255,0.04);padding:6px 8px;border-radius:8px;border:1px solid rgba(255,255,255,0.05);color:#e6eef8;}
-.qr-preview{position:relative;border-radius:14px;padding:14px;border:1px solid rgba(255,255,255,0.03);background:rgba(255,255,255,0.01)}
-.three-dots{position:absolute; right:20px; top:20px; cursor:pointer; font-size:14px; color:rgba(255,255,255,0.8); padding:6px; border-radius:8px;}
-.three-dots:hover{background:rgba(255,255,255,0.02);}
-select{
-  background:rgba(255,255,255,0.06);
-  border:1px solid rgba(255,255,255,0.25);
-  backdrop-filter:blur(14px);
-  border-radius:8px;
-  color:white;
-}
-select option{
-  background:#1e293b;
-  color:white;
-}
-.modal-backdrop{
-  position:fixed;
-  inset:0;
-  background:rgba(2,6,23,0.6);
-  display:none;
-  align-items:center;
-  justify-content:center;
-  z-index:50;
-  backdrop-filter: blur(12px); /* Added for medium blur */
-}
-
-.modal{
-  background:linear-gradient(180deg, rgba(255,255,255,0.02), rgba(255,255,255,0.01));
-  border-radius:12px;
-  padding:18px;
-  width:400px;
-  border:2px solid rgba(255,255,255,0.10);
-}
-
-.fixed-buttons-container {
-    /* 1. Sets the element relative to the browser window */
-    position: absolute; 
-    
-    /* 2. Positions the element 20px from the bottom edge */
-    bottom: 170px; 
-    
-    /* 3. Positions the element 20px from the left edge */
-    left: 400px; 
-    z-index: 1000; /* Ensures it stays above other content */
-    
-    /* Optional: Add a small gap between the two buttons */
-    display: flex;
-    display: flex;
-    flex-direction: column;
-    gap: 50px;
-}
-.small-muted{font-size:12px;color:rgba(230,238,248,0.6);}
-.url-box {
-  /* --- Existing Styles --- */
-  background: rgba(255, 255, 255, 0.03);
-  padding: 10px;
-  border-radius: 10px;
-  font-family: monospace;
-  color: #e0eeff;
-  margin-top: 10px;
-  overflow-wrap: break-word; /* Essential for long URLs to break and wrap */
-  
-  /* --- The Solution --- */
-  
-  /* 1. Set the fixed width (you can change this value) */
-  width: 400px; 
-  
-  /* 2. (Optional but recommended) Explicitly set height to auto */
-  height: auto; 
-}
-.row{display:flex;gap:10px;align-items:center;}
-.hidden{display:none;}
-</style>
+<link rel="stylesheet" href="/static/qr_gen.css?v={{ static_version }}">
 </head>
 <body>
 <h1>
@@ -446,7 +660,7 @@ select option{
     <div class="flex flex-col items-center">
       <div class="qr-preview w-full max-w-sm">
         {% if qr_image %}
-          <img id="qrImage" src="data:image/png;base64,{{ qr_image }}" class="rounded-md max-w-full">
+          <img id="qrImage" src="{{ qr_image }}" class="rounded-md max-w-full">
         {% else %}
           <div class="p-8 text-center opacity-60">QR preview shows here</div>
         {% endif %}
@@ -454,6 +668,9 @@ select option{
 
       {% if qr_image %}
         <div class="url-box" id="displayUrl">{{ display_url }}</div>
+        {% if qr_version %}
+          <div class="mt-2 text-sm opacity-70">QR version {{ qr_version }} ({{ qr_version * 4 + 17 }}&times;{{ qr_version * 4 + 17 }} modules)</div>
+        {% endif %}
         <a href="/download_qr" class="w-full mt-3 py-3 btn-download text-center">Download QR Code (PNG)</a>
       {% endif %}
     </div>
@@ -559,7 +776,7 @@ select option{
       <input id="modalBoxSize" class="input" type="number" min="1" max="20" value="5">
     </div>
     <div style="margin-bottom:14px;">
-      <label class="small-muted">Custom Background Image (PNG/JPG)</label>
+      <label class="small-muted">Custom Background Image (PNG/JPG)</label>
       <input id="modalBgImage" type="file" name="background_image_file" accept="image/png, image/jpeg" class="w-full text-sm text-gray-400 file:mr-4 file:py-2 file:px-4 file:rounded-full file:border-0 file:text-sm file:font-semibold file:bg-violet-50 file:text-violet-700 hover:file:bg-violet-100">
       <input type="hidden" id="deleteBg" name="delete_bg" value="0">
       <button type="button" class="mt-2 small-btn text-xs" onclick="deleteBackgroundImage()">Remove Current Image</button>
@@ -582,298 +799,51 @@ select option{
   </div>
 </div>
 
-<script>
-/* ---------- Platform blocks ---------- */
-let shown = 1;
-function showNext() {
-    document.getElementById("block1").classList.remove("hidden");
-    document.getElementById("block2").classList.remove("hidden");
-    document.getElementById("block3").classList.remove("hidden");
-    shown = 3;
-}
-function deleteBackgroundImage() {
-    document.getElementById('modalBgImage').value = ''; // Clear file input
-    document.getElementById('deleteBg').value = '1'; // Signal server to remove
-    const form = document.getElementById('qrForm');
-    const deleteHidden = document.getElementById('deleteBg');
-    form.appendChild(deleteHidden);
-    form.submit(); // Regenerate QR
-}
+<script src="/static/qr_gen.js?v={{ static_version }}"></script>
 
-/* ---------- Platform URL HANDLING ---------- */
-const PLATFORM_BASES={
-    facebook:'https://www.facebook.com/',
-    instagram:'https://www.instagram.com/',
-    youtube:'https://www.youtube.com/@',
-    linkedin:'https://www.linkedin.com/in/',
-    whatsapp:'https://wa.me/',
-    drive:'https://drive.google.com/open?id=',
-    googleform:'https://docs.google.com/forms/d/',
-    tel:'tel:',
-    sms:'sms:',
-    mailto:'mailto:',
-    '': ''
-};
-
-function create(platform, username){
-    if(!platform || !username) return "";
-    if(platform === 'other') return username; // for other, username is the full link
-    let base = PLATFORM_BASES[platform];
-    if(platform==='googleform'){
-        return base + username + '/viewform';
-    }
-    if(platform==='youtube'){
-        username = username.startsWith('@') ? username.substring(1) : username;
-    }
-    // Clean phone entries for whatsapp/tel/sms
-    if(platform==='whatsapp' || platform==='tel' || platform==='sms'){
-        username = username.replace(/[^0-9+]/g,'');
-    }
-    return base + username;
-}
-
-function updateLink1(){
-    document.getElementById("finalLink1").value =
-        create(document.getElementById("platform1").value, document.getElementById("username1").value.trim());
-}
-function updateLink2(){
-    document.getElementById("finalLink2").value =
-        create(document.getElementById("platform2").value, document.getElementById("username2").value.trim());
-}
-function updateLink3(){
-    document.getElementById("finalLink3").value =
-        create(document.getElementById("platform3").value, document.getElementById("username3").value.trim());
-}
-
-/* ---------- Label dropdown logic (main form) ---------- */
-function onLabelPresetChange(){
-    const sel = document.getElementById('labelPreset');
-    const customInput = document.getElementById('customLabelInput');
-    const hiddenField = document.getElementById('custom_text');
-
-    if(sel.value === 'Custom'){
-        customInput.classList.remove('hidden');
-        hiddenField.value = customInput.value || "";
-    } else {
-        customInput.classList.add('hidden');
-        hiddenField.value = sel.value;
-    }
-}
-document.getElementById('customLabelInput').addEventListener('input', function(){
-    document.getElementById('custom_text').value = this.value;
-});
-
-/* Initialize label fields from server-provided value */
-(function initLabelFromServer(){
-    try {
-        const serverVal = `{{ saved_data.custom_text }}`.trim();
-        if(serverVal && serverVal !== 'None'){
-            // if matches a preset, select that preset; else choose Custom and populate
-            const presets = ['Scan Me!','Visit My Profile','Contact Me'];
-            if(presets.includes(serverVal)){
-                document.getElementById('labelPreset').value = serverVal;
-                document.getElementById('customLabelInput').classList.add('hidden');
-                document.getElementById('custom_text').value = serverVal;
-            } else {
-                document.getElementById('labelPreset').value = 'Custom';
-                document.getElementById('customLabelInput').classList.remove('hidden');
-                document.getElementById('customLabelInput').value = serverVal;
-                document.getElementById('custom_text').value = serverVal;
-            }
-        }
-    } catch(e){}
-})();
-
-/* ---------- Add Platform Modal ---------- */
-function openAddPlatformModal(){
-    // optionally pre-populate from current? but probably clear them
-    const modalBackdrop = document.getElementById('addPlatformBackdrop');
-    modalBackdrop.style.display = 'flex';
-}
-
-function closeAddPlatformModal(){
-    const modalBackdrop = document.getElementById('addPlatformBackdrop');
-    modalBackdrop.style.display = 'none';
-}
-
-/* Apply add platform settings */
-function applyAddPlatform(){
-    // set the form fields from modal
-    document.getElementById('platform1').value = document.getElementById('modalPlatform1').value;
-    document.getElementById('username1').value = document.getElementById('modalUsername1').value;
-    document.getElementById('platform2').value = document.getElementById('modalPlatform2').value;
-    document.getElementById('username2').value = document.getElementById('modalUsername2').value;
-    document.getElementById('platform3').value = document.getElementById('modalPlatform3').value;
-    document.getElementById('username3').value = document.getElementById('modalUsername3').value;
-
-    // update the hidden links
-    updateLink1();
-    updateLink2();
-    updateLink3();
-
-    // show preview of added links as platform buttons
-    const linksList = document.getElementById('linksList');
-    linksList.innerHTML = '';
-    const platforms = [
-        {plat: document.getElementById('platform1').value, user: document.getElementById('username1').value, link: document.getElementById('finalLink1').value, label: 'Platform 1'},
-        {plat: document.getElementById('platform2').value, user: document.getElementById('username2').value, link: document.getElementById('finalLink2').value, label: 'Platform 2'},
-        {plat: document.getElementById('platform3').value, user: document.getElementById('username3').value, link: document.getElementById('finalLink3').value, label: 'Platform 3'}
-    ];
-
-    const PLATFORM_BUTTON_STYLES = {
-        facebook: 'bg-blue-600 hover:bg-blue-700 text-white',
-        instagram: 'bg-pink-600 hover:bg-pink-700 text-white',
-        youtube: 'bg-red-600 hover:bg-red-700 text-white',
-        linkedin: 'bg-blue-700 hover:bg-blue-800 text-white',
-        whatsapp: 'bg-green-600 hover:bg-green-700 text-white',
-        tel: 'bg-green-700 hover:bg-green-800 text-white',
-        sms: 'bg-yellow-600 hover:bg-yellow-700 text-white',
-        mailto: 'bg-red-600 hover:bg-red-700 text-white',
-        other: 'bg-indigo-600 hover:bg-indigo-700 text-white',
-        default: 'bg-gray-600 hover:bg-gray-700 text-white'
-    };
-
-    const PLATFORM_ICONS = {
-        facebook: '<i class="fab fa-facebook-f"></i>',
-        instagram: '<i class="fab fa-instagram"></i>',
-        youtube: '<i class="fab fa-youtube"></i>',
-        linkedin: '<i class="fab fa-linkedin-in"></i>',
-        whatsapp: '<i class="fab fa-whatsapp"></i>',
-        tel: '<i class="fa-solid fa-phone"></i>',
-        sms: '<i class="fa-solid fa-message"></i>',
-        mailto: '<i class="fa-solid fa-envelope"></i>',
-        other: '<i class="fa-solid fa-link"></i>',
-        default: '<i class="fa-solid fa-globe"></i>'
-    };
-
-    platforms.forEach((p, idx) => {
-        if(p.plat && p.user && p.link){
-            const button = document.createElement('button');
-            const styleKey = p.plat in PLATFORM_BUTTON_STYLES ? p.plat : 'default';
-            const icon = PLATFORM_ICONS[styleKey];
-            const name = p.plat === 'tel' ? 'Call' : p.plat === 'sms' ? 'Text' : p.plat === 'mailto' ? 'Email' : p.plat === 'other' ? 'Custom' : p.plat.charAt(0).toUpperCase() + p.plat.slice(1);
-
-            button.innerHTML = `${icon} ${name}`;
-            button.className = `m-1 px-3 py-2 rounded-md text-sm font-medium transition ${PLATFORM_BUTTON_STYLES[styleKey]}`;
-            button.onclick = () => window.open(p.link, '_blank');
-            linksList.appendChild(button);
-        }
-    });
-    document.getElementById('linksPreview').style.display = 'block';
-
-    // close modal
-    closeAddPlatformModal();
-}
-
-/* ---------- Modal & three-dots ---------- */
-const threeDots = document.getElementById('threeDots');
-const modalBackdrop = document.getElementById('modalBackdrop');
-
-threeDots && threeDots.addEventListener('click', function(){
-    // sync modal inputs with current form values
-    const curLabel = document.getElementById('custom_text').value || 'Scan Me!';
-    const presetOptions = ['Scan Me!','Visit My Profile','Contact Me'];
-    const modalPreset = document.getElementById('modalLabelPreset');
-    if(presetOptions.includes(curLabel)){
-        modalPreset.value = curLabel;
-        document.getElementById('modalCustomLabel').classList.add('hidden');
-    } else {
-        modalPreset.value = 'Custom';
-        document.getElementById('modalCustomLabel').classList.remove('hidden');
-        document.getElementById('modalCustomLabel').value = curLabel;
-    }
-    // populate box size from hidden field or default
-    const boxField = document.getElementById('box_size_field').value;
-    document.getElementById('modalBoxSize').value = boxField ? boxField : 5;
-    // error level
-    const errField = document.getElementById('error_level_field').value || 'L';
-    document.getElementById('modalErrorLevel').value = errField;
-
-    modalBackdrop.style.display = 'flex';
-});
-
-function closeModal(){ modalBackdrop.style.display = 'none'; }
-
-function onModalLabelPresetChange(){
-    const sel = document.getElementById('modalLabelPreset');
-    const cust = document.getElementById('modalCustomLabel');
-    if(sel.value === 'Custom') cust.classList.remove('hidden');
-    else cust.classList.add('hidden');
-}
-document.getElementById('modalLabelPreset').addEventListener('change', onModalLabelPresetChange);
-
-/* Apply modal settings to the form and submit */
-function applyModalSettings(){
-    // label
-    const modalPreset = document.getElementById('modalLabelPreset').value;
-    const modalCustom = document.getElementById('modalCustomLabel').value || '';
-    if(modalPreset === 'Custom'){
-        document.getElementById('labelPreset').value = 'Custom';
-        document.getElementById('customLabelInput').classList.remove('hidden');
-        document.getElementById('customLabelInput').value = modalCustom;
-        document.getElementById('custom_text').value = modalCustom;
-    } else {
-        document.getElementById('labelPreset').value = modalPreset;
-        document.getElementById('customLabelInput').classList.add('hidden');
-        document.getElementById('custom_text').value = modalPreset;
-    }
-
-    // box size & error
-    const boxVal = parseInt(document.getElementById('modalBoxSize').value) || 5;
-    document.getElementById('box_size_field').value = boxVal;
-
-    const errVal = document.getElementById('modalErrorLevel').value || 'L';
-    document.getElementById('error_level_field').value = errVal;
-
-    // append file input if file is selected
-    const form = document.getElementById('qrForm');
-    const fileInput = document.getElementById('modalBgImage');
-    const deleteHidden = document.getElementById('deleteBg');
-    if (fileInput.files.length > 0) {
-        form.appendChild(fileInput);
-    }
-    if (deleteHidden.value === '1') {
-        form.appendChild(deleteHidden);
-    }
+</body>
+</html>
 
-    // close modal and submit form to regenerate QR
-    modalBackdrop.style.display = 'none';
-    form.submit();
-}
+"""
 
-/* modal custom label input listener */
-document.getElementById('modalCustomLabel').addEventListener('input', function(){
-    // live sync not necessary; will apply on Apply
-});
-
-/* ---------- keep link inputs updated on submit (just in case) ---------- */
-document.getElementById('qrForm').addEventListener('submit', function(){
-    updateLink1(); updateLink2(); updateLink3();  
-    // ensure custom_text field populated if customLabelInput visible
-    const preset = document.getElementById('labelPreset').value;
-    if(preset === 'Custom'){
-        document.getElementById('custom_text').value = document.getElementById('customLabelInput').value || '';
-    } else {
-        document.getElementById('custom_text').value = preset;
-    }
-});
+# --- Page Template (compiled once; CSS/JS live in static/ and are cache-busted by content hash) ---
+STATIC_ASSETS = ('qr_gen.css', 'qr_gen.js')
+STATIC_MAX_AGE = 365 * 24 * 3600
+app.config['SEND_FILE_MAX_AGE_DEFAULT'] = STATIC_MAX_AGE
 
-/* small helper to set server default for JS templating safety */
-</script>
+def _static_version():
+    h = hashlib.sha256()
+    for name in STATIC_ASSETS:
+        with open(os.path.join(app.static_folder, name), 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()[:12]
 
-</body>
-</html>
+STATIC_VERSION = _static_version()
+PAGE_TEMPLATE = app.jinja_env.from_string(HTML_TEMPLATE)
 
-"""
+def render_page(**context):
+    with qr_timing.stage("template"):
+        return PAGE_TEMPLATE.render(
+            static_version=STATIC_VERSION, DEFAULT_QR_BOX_SIZE=DEFAULT_QR_BOX_SIZE, **context
+        )
 
 # ----------------------------------------------------------------------------------------------------
 # ROUTES
 # ----------------------------------------------------------------------------------------------------
 
+def render_state_card(state, profile=DEFAULT_PNG_PROFILE) -> render_cache.RenderedCard:
+    # Re-render (usually a cache hit: /generate_qr just rendered the same card) from a session's last settings
+    saved_input_data = state.get("inputs", {})
+    box_size = int(saved_input_data.get("box_size") or DEFAULT_QR_BOX_SIZE)
+    err_level_raw = saved_input_data.get("error_level") or 'L'
+    qr_error = ERROR_LEVELS.get(err_level_raw, DEFAULT_QR_ERROR)
+    return render_card_png(
+        state["qr_data"], box_size, qr_error, saved_input_data.get("custom_text",""), profile,
+        background_store.resolve(state.get("background"))
+    )
+
 @app.route('/')
 def index():
-    global saved_input_data, last_qr_data
-    last_qr_data = None
     saved_input_data = {
         "name": "Abilash",
         "message": "Check out my profile!",
@@ -888,28 +858,34 @@ def index():
         "box_size": "",
         "error_level": ""
     }
-    return render_template_string(HTML_TEMPLATE, qr_image=None, saved_data=saved_input_data, DEFAULT_QR_BOX_SIZE=DEFAULT_QR_BOX_SIZE)
+    # The uploaded background (and short link) stays with the session until it is deleted, as before
+    state = load_state()
+    save_state({
+        "inputs": saved_input_data, "qr_data": None,
+        "background": state.get("background"), "short_code": state.get("short_code"),
+    })
+    return render_page(qr_image=None, saved_data=saved_input_data)
 
 @app.route('/generate_qr', methods=['POST'])
 def generate_qr():
-    global saved_input_data, last_qr_data
-
+    state = load_state()
     # --- 🌟 NEW: Background Image Handling 🌟 ---
-    
+    background_key = state.get("background")
+
     # 1. Check for deletion request
-    if request.form.get('delete_bg') == '1' and os.path.exists(USER_BG_PATH):
-        os.remove(USER_BG_PATH)
+    if request.form.get('delete_bg') == '1':
+        background_key = None
 
     # 2. Check for file upload
     if 'background_image_file' in request.files:
         bg_file = request.files['background_image_file']
         if bg_file and bg_file.filename:
-            # Save the new file to the predefined user path
+            # Size/pixel limits are checked here; scaled copies are decoded off-thread or when a card needs them
             try:
-                # Use PIL to ensure image integrity before saving
-                img = Image.open(bg_file.stream)
-                img.save(USER_BG_PATH)
-            except Exception as e:
+                with qr_timing.stage("upload"):
+                    background_key = background_store.accept(bg_file.stream)
+            except bg_upload.UploadError as e:
+                UPLOADS_REJECTED.inc()
                 print(f"Error saving background image: {e}")
                 # Log error but continue with QR generation
     
@@ -918,21 +894,10 @@ def generate_qr():
     # Read form fields (including new box_size and error_level)
     # ... (rest of form reading logic remains the same) ...
     # Read form fields (including new box_size and error_level)
-    box_size_raw = request.form.get("box_size", "")
-    try:
-        box_size = int(box_size_raw) if box_size_raw else DEFAULT_QR_BOX_SIZE
-        if box_size < 1: box_size = DEFAULT_QR_BOX_SIZE
-    except Exception:
-        box_size = DEFAULT_QR_BOX_SIZE
+    box_size = parse_box_size(request.form.get("box_size", ""))
 
     err_level_raw = request.form.get("error_level", "")  # expected 'L','M','Q','H'
-    err_map = {
-        'L': qrcode.constants.ERROR_CORRECT_L,
-        'M': qrcode.constants.ERROR_CORRECT_M,
-        'Q': qrcode.constants.ERROR_CORRECT_Q,
-        'H': qrcode.constants.ERROR_CORRECT_H
-    }
-    qr_error = err_map.get(err_level_raw, DEFAULT_QR_ERROR)
+    qr_error = ERROR_LEVELS.get(err_level_raw, DEFAULT_QR_ERROR)
     
     # ... (rest of saved_input_data dict remains the same) ...
 
@@ -958,62 +923,207 @@ def generate_qr():
 
     # ... (rest of QR generation logic remains the same) ...
 
-    encoded_url = generate_target_url(saved_input_data)
-    last_qr_data = encoded_url
-
-    # Create QR with provided box_size and error correction
-    qr = qrcode.QRCode(box_size=box_size, error_correction=qr_error)
-    qr.add_data(encoded_url)
-    qr.make(fit=True)
-    qr_img = qr.make_image(fill_color="black", back_color="white").convert("RGB")
-
-    final_card = add_custom_graphics(qr_img, saved_input_data.get("custom_text",""))
-    buf = io.BytesIO()
-    final_card.save(buf, format="PNG")
-    buf.seek(0)
-    qr_b64 = base64.b64encode(buf.read()).decode()
-
-    return render_template_string(HTML_TEMPLATE,
-        qr_image=qr_b64,
+    with qr_timing.stage("url"):
+        encoded_url = generate_target_url(saved_input_data)
+        short_code = state.get("short_code")
+        if LINK_MODE == "short":
+            short_code = short_link_for(short_code, encoded_url)
+            encoded_url = short_links.short_url(SHORT_LINK_BASE or request.host_url, short_code)
+
+    # Create QR with provided box_size and error correction (served from the card cache when unchanged)
+    card = render_card_png(
+        encoded_url, box_size, qr_error, saved_input_data.get("custom_text",""),
+        user_bg_path=background_store.resolve(background_key)
+    )
+    save_state({
+        "inputs": saved_input_data, "qr_data": encoded_url, "card_key": card.key,
+        "background": background_key, "short_code": short_code,
+    })
+
+    # The page references the cached PNG by URL instead of inlining it as a data URI
+    return render_page(
+        qr_image=f"/qr/{card.key}.png",
+        qr_version=card.version,
         display_url=urllib.parse.unquote(encoded_url),
-        saved_data=saved_input_data,
-        DEFAULT_QR_BOX_SIZE=DEFAULT_QR_BOX_SIZE
+        saved_data=saved_input_data
     )
 @app.route('/download_qr')
 def download_qr():
-    global last_qr_data, saved_input_data
+    state = load_state()
+    last_qr_data = state.get("qr_data")
     if not last_qr_data:
         return "No QR generated yet", 400
 
-    # Use last submitted settings if present
-    box_size = int(saved_input_data.get("box_size") or DEFAULT_QR_BOX_SIZE)
-    err_level_raw = saved_input_data.get("error_level") or 'L'
-    err_map = {
-        'L': qrcode.constants.ERROR_CORRECT_L,
-        'M': qrcode.constants.ERROR_CORRECT_M,
-        'Q': qrcode.constants.ERROR_CORRECT_Q,
-        'H': qrcode.constants.ERROR_CORRECT_H
-    }
-    qr_error = err_map.get(err_level_raw, DEFAULT_QR_ERROR)
-
-    qr = qrcode.QRCode(box_size=box_size, error_correction=qr_error)
-    qr.add_data(last_qr_data)
-    qr.make(fit=True)
-    qr_img = qr.make_image(fill_color="black", back_color="white").convert("RGB")
-
-    final_card = add_custom_graphics(qr_img, saved_input_data.get("custom_text",""))
-    buf = io.BytesIO()
-    final_card.save(buf, format="PNG")
-    buf.seek(0)
+    saved_input_data = state.get("inputs", {})
+    fmt = request.args.get("format", "png").lower()
+    if fmt == "svg":
+        # Vector card for print: scales to any size without a huge box_size bitmap
+        qr_error = ERROR_LEVELS.get(saved_input_data.get("error_level") or 'L', DEFAULT_QR_ERROR)
+        box_size = int(saved_input_data.get("box_size") or DEFAULT_QR_BOX_SIZE)
+        data, _ = dispatch_render(
+            render_output, last_qr_data, box_size, qr_error, saved_input_data.get("custom_text",""), "svg", "card",
+            DEFAULT_PNG_PROFILE, background_store.resolve(state.get("background"))
+        )
+        buf = io.BytesIO(data)
+        mimetype = "image/svg+xml"
+    else:
+        fmt, mimetype = "png", "image/png"
+        buf = io.BytesIO(render_state_card(state, parse_png_profile(request.args.get("profile"))).png)
+
+    filename = (saved_input_data.get("name","qrcode").replace(" ", "_") or "qrcode") + "_qr." + fmt
+    return send_file(buf, mimetype=mimetype, as_attachment=True, download_name=filename, max_age=0)
+
+@app.route('/qr/<key>.png')
+def qr_image(key):
+    # Content-addressed, so a hit can be cached by the browser forever
+    card = card_cache.get(key)
+    if card is None:
+        # Evicted, or rendered by another worker process: rebuild it if it is this session's card
+        state = load_state()
+        if state.get("card_key") != key or not state.get("qr_data"):
+            return "Not found", 404
+        card = render_state_card(state)
+    response = Response(card.png, mimetype="image/png")
+    response.headers["Content-Length"] = str(len(card.png))
+    response.headers["Cache-Control"] = f"public, max-age={STATIC_MAX_AGE}, immutable"
+    return response
+
+@app.route('/api/qr', methods=['GET', 'POST'])
+def api_qr():
+    # Same fields as the form, from the query string, a JSON body or form data; returns raw image bytes
+    if request.method == 'POST':
+        row = request.get_json(silent=True)
+        if row is None:
+            row = request.form.to_dict()
+    else:
+        row = request.args.to_dict()
+    if not isinstance(row, dict):
+        return jsonify(error="Expected a JSON object"), 400
+
+    fmt = str(row.get("format") or "png").lower()
+    if fmt not in IMAGE_FORMATS:
+        return jsonify(error=f"Unsupported format '{fmt}'", formats=sorted(IMAGE_FORMATS)), 400
+    layout = str(row.get("layout") or "card").lower()
+    if layout not in LAYOUTS:
+        return jsonify(error=f"Unsupported layout '{layout}'", layouts=list(LAYOUTS)), 400
+
+    spec = normalize_spec(row)
+    profile = parse_png_profile(row.get("profile"))
+    with qr_timing.stage("url"):
+        encoded_url = generate_target_url(spec)
+    qr_error = ERROR_LEVELS.get(spec["error_level"], DEFAULT_QR_ERROR)
+    try:
+        if fmt == "png" and layout == "card":
+            card = render_card_png(
+                encoded_url, spec["box_size"], qr_error, spec["custom_text"], profile, mask_pattern=spec["mask"]
+            )
+            data, version, etag = card.png, card.version, card.key
+        else:
+            data, version = dispatch_render(
+                render_output, encoded_url, spec["box_size"], qr_error, spec["custom_text"], fmt, layout, profile,
+                None, spec["mask"]
+            )
+            etag = None
+    except ValueError as e:
+        # The encoder raises ValueError when the data does not fit in a version 40 symbol
+        return jsonify(error=str(e)), 400
+
+    response = Response(data, mimetype=IMAGE_FORMATS[fmt][1])
+    response.headers["Content-Length"] = str(len(data))
+    response.headers["X-QR-Version"] = str(version)
+    if etag:
+        response.set_etag(etag)
+        response.make_conditional(request)
+    return response
+
+MAX_ZIP_CARDS = 5000
+
+@app.route('/download_zip', methods=['POST'])
+def download_zip():
+    # Body: a JSON list of card specs, or {"cards": [...], "format": ..., "layout": ..., "profile": ...};
+    # the archive is rendered and streamed entry by entry
+    payload = request.get_json(silent=True)
+    rows = payload.get("cards") if isinstance(payload, dict) else payload
+    if not isinstance(rows, list) or not rows or not all(isinstance(row, dict) for row in rows):
+        return "Expected a JSON list of card objects", 400
+    if len(rows) > MAX_ZIP_CARDS:
+        return f"At most {MAX_ZIP_CARDS} cards per archive", 413
+    options = payload if isinstance(payload, dict) else {}
+    fmt = str(options.get("format") or "png").lower()
+    layout = str(options.get("layout") or "card").lower()
+    if fmt not in IMAGE_FORMATS or layout not in LAYOUTS:
+        return "Unsupported format or layout", 400
+    profile = parse_png_profile(options.get("profile"))
+
+    def entries():
+        specs = [normalize_spec(row) for row in rows]
+        for index, (spec, render) in enumerate(zip(specs, render_specs(specs, fmt, layout, profile)), start=1):
+            try:
+                _, data, _ = render.result()
+            except Exception as e:
+                yield card_filename(index, spec, "error.txt"), f"{type(e).__name__}: {e}\n".encode()
+                continue
+            yield card_filename(index, spec, fmt), data
+
+    return Response(
+        stream_with_context(zip_stream.iter_zip(entries())),
+        mimetype="application/zip",
+        headers={"Content-Disposition": "attachment; filename=qr_cards.zip"}
+    )
 
-    filename = (saved_input_data.get("name","qrcode").replace(" ", "_") or "qrcode") + "_qr.png"
-    return send_file(buf, mimetype="image/png", as_attachment=True, download_name=filename)
+@app.route('/r/<code>')
+@app.route('/R/<code>')
+def short_link_redirect(code):
+    target = short_link_store.resolve(code)
+    if target is None:
+        return "Unknown link", 404
+    scan_recorder.record(code.upper(), request.headers.get("User-Agent", ""))
+    response = redirect(target, code=302)
+    response.headers["Cache-Control"] = "no-store"  # every scan must reach us to be counted
+    return response
+
+@app.route('/api/scans')
+def api_scans():
+    # ?code=ABC1234&since=<unix time>&until=<unix time>; counts can lag by one flush interval
+    try:
+        since = float(request.args["since"]) if request.args.get("since") else None
+        until = float(request.args["until"]) if request.args.get("until") else None
+    except ValueError:
+        return jsonify(error="since/until must be unix timestamps"), 400
+    scan_recorder.flush()  # include this process's own buffered scans
+    code = request.args.get("code", "").upper() or None
+    return jsonify(scans=scan_recorder.counts(code, since, until), dropped=scan_recorder.dropped)
+
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.exposition(), mimetype="text/plain; version=0.0.4")
+
+# --- Shut-down (run by qr_serve workers after their last request) ---
+def shut_down():
+    if render_farm_pool is not None:
+        render_farm_pool.close()
+    scan_recorder.flush()
+    metrics.flush()
+
+# --- Warm-up (run by qr_serve workers before they accept traffic) ---
+def warm_up():
+    warm_up_renderer()
+    if render_farm_pool is not None:
+        # Spawn and warm the workers now, so the first render does not wait for them
+        render_farm_pool.start(timeout=RENDER_FARM_TIMEOUT)
+
+def warm_up_renderer():
+    qr_render.warm_labels(FONT_PATH, 16)
+    # One full render decodes the background for the common card size and touches every code path
+    warm_url = generate_target_url({"name": "warm-up", "message": "Check out my profile!"})
+    render_card_image(warm_url, DEFAULT_QR_BOX_SIZE, DEFAULT_QR_ERROR, qr_render.DEFAULT_LABEL)
 
 # ----------------------------------------------------------------------------------------------------
 
 if __name__ == "__main__":
     def start_server():
-        app.run(host="127.0.0.1", port=5000, use_reloader=False)
+        warm_up()
+        qr_serve.make_server(app, "127.0.0.1", 5000, threads=4).serve_forever()
 
     t = Thread(target=start_server)
     t.daemon = True
@@ -0,0 +1,177 @@
+import hashlib
+import io
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+# --- Limits ---
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+MAX_UPLOAD_PIXELS = 40_000_000
+STORE_MAX_SIDE = 4096  # default; QR_GEN passes the longest side of the largest card it can render
+STORE_MIN_SIDE = 512  # smallest scaled copy; each larger one doubles, up to max_side
+STORE_MAX_BYTES = 512 * 1024 * 1024  # least recently used backgrounds are deleted beyond this
+TOUCH_INTERVAL = 60  # seconds between recency updates of one stored upload
+READ_CHUNK = 64 * 1024
+
+
+class UploadError(ValueError):
+    pass
+
+
+class BackgroundStore:
+    """Content-addressed store of uploaded backgrounds, with copies pre-scaled for cards.
+
+    accept() reads and validates the upload in the request thread (a bounded read and a
+    header-only parse) and writes the original bytes under their content hash; identical uploads
+    share one key. Cards decode scaled copies, not the original: scaled_path() picks the smallest
+    of a ladder of sizes (min_side, doubling, up to max_side) that covers the card and creates it on
+    first use, letting libjpeg decode straight to about that size. The smallest copy is made ahead
+    of time on a small thread pool, so the uploading request never waits for a full decode.
+
+    Stored files are never rewritten, so their mtime (part of the background and card cache keys)
+    stays put; recency for eviction is kept in the original's atime. on_accept(key, size), if
+    given, is called for every accepted upload. The directory is kept under max_bytes by deleting
+    the least recently used uploads together with their copies.
+    """
+
+    def __init__(self, directory, max_side=STORE_MAX_SIDE, workers=2, on_accept=None, max_bytes=STORE_MAX_BYTES,
+                 min_side=STORE_MIN_SIDE):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.on_accept = on_accept
+        self.sides = []
+        side = min(min_side, max_side)
+        while side < max_side:
+            self.sides.append(side)
+            side *= 2
+        self.sides.append(max_side)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="qrgen-bg")
+        self._scaling = {}  # scaled copy path -> Lock, so each copy is made once per process
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path_for(self, key):
+        return os.path.join(self.directory, f"{key}.upload")
+
+    def accept(self, stream) -> str:
+        """Validate and store an uploaded file stream; returns its content key."""
+        data = _read_limited(stream, MAX_UPLOAD_BYTES)
+        try:
+            with Image.open(io.BytesIO(data)) as img:
+                width, height = img.size  # header only; pixels are not decoded here
+        except Exception as e:
+            raise UploadError(f"Not a readable image: {e}") from e
+        if width * height > MAX_UPLOAD_PIXELS:
+            raise UploadError(f"Image is {width}x{height}; at most {MAX_UPLOAD_PIXELS} pixels are allowed")
+
+        key = hashlib.sha256(data).hexdigest()
+        path = self.path_for(key)
+        if not os.path.exists(path):
+            _write_atomic(path, data)
+            self._pool.submit(self._prescale, path)
+        if self.on_accept is not None:
+            self.on_accept(key, len(data))
+        return key
+
+    def resolve(self, key):
+        """Path of a stored upload (pass it to scaled_path() before decoding); None if unknown."""
+        if not key:
+            return None
+        path = self.path_for(key)
+        try:
+            st = os.stat(path)
+            if time.time() - st.st_atime > TOUCH_INTERVAL:
+                os.utime(path, ns=(time.time_ns(), st.st_mtime_ns))  # recency for eviction; mtime unchanged
+        except OSError:
+            return None
+        return path
+
+    def scaled_path(self, path, side):
+        """Path of the stored copy of upload `path` whose longest side covers `side` pixels; None if it is gone."""
+        scaled = self.sides[-1]
+        for candidate in self.sides:
+            if candidate >= side:
+                scaled = candidate
+                break
+        scaled_path = f"{path[:-len('.upload')]}.{scaled}.png"
+        if os.path.exists(scaled_path):
+            return scaled_path
+        with self._lock:
+            lock = self._scaling.setdefault(scaled_path, threading.Lock())
+        with lock:
+            try:
+                if not os.path.exists(scaled_path):
+                    self._scale(path, scaled, scaled_path)
+            except OSError:
+                return None  # evicted meanwhile
+            finally:
+                with self._lock:
+                    self._scaling.pop(scaled_path, None)
+        return scaled_path
+
+    def _scale(self, path, side, scaled_path):
+        with Image.open(path) as img:
+            # JPEG: let libjpeg decode at 1/2, 1/4 or 1/8 scale straight to roughly the target size
+            img.draft("RGB", (side, side))
+            img = img.convert("RGB")
+        img.thumbnail((side, side), Image.Resampling.BICUBIC, reducing_gap=2.0)
+        buf = io.BytesIO()
+        img.save(buf, format="PNG", compress_level=1)
+        _write_atomic(scaled_path, buf.getvalue())
+
+    def _prescale(self, path):
+        try:
+            self.scaled_path(path, 0)
+        finally:
+            self.evict()
+
+    def evict(self):
+        """Delete least recently used uploads, with their scaled copies, until the directory fits in max_bytes."""
+        groups = {}  # key -> [last used, bytes, paths]
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(".tmp"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                group = groups.setdefault(entry.name.split(".", 1)[0], [0.0, 0, []])
+                group[0] = max(group[0], stat.st_atime, stat.st_mtime)
+                group[1] += stat.st_size
+                group[2].append(entry.path)
+        total = sum(size for _, size, _ in groups.values())
+        for _, size, paths in sorted(groups.values()):
+            if total <= self.max_bytes:
+                break
+            for path in paths:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            total -= size
+
+
+def _write_atomic(path, data):
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _read_limited(stream, limit):
+    chunks, total = [], 0
+    while True:
+        chunk = stream.read(READ_CHUNK)
+        if not chunk:
+            break
+        total += len(chunk)
+        if total > limit:
+            raise UploadError(f"Upload exceeds {limit // (1024 * 1024)} MiB")
+        chunks.append(chunk)
+    if not total:
+        raise UploadError("Empty upload")
+    return b"".join(chunks)
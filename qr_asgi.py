@@ -0,0 +1,240 @@
+"""asyncio serving mode: the QR generator as an ASGI app.
+
+The event loop owns every connection, so idle keep-alive clients and slow uploads cost a coroutine
+rather than a thread. A request is handed to the Flask app only once its body has been received
+completely (spooled to a temporary file past SPOOL_MEMORY_BYTES), and then runs on a bounded pool of
+render threads; at most max_pending complete requests wait for a thread, the rest wait on the loop.
+Response bodies are sent chunk by chunk as the app produces them, so the ZIP export streams.
+
+    python qr_asgi.py --bind 0.0.0.0:8000 --threads 4
+    uvicorn qr_asgi:app --host 0.0.0.0 --port 8000
+
+Needs an ASGI server (uvicorn) to run; the app itself has no dependencies beyond the Flask app.
+"""
+import argparse
+import asyncio
+import contextvars
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import QR_GEN
+import qr_serve
+
+DEFAULT_BIND = "127.0.0.1:8000"
+DEFAULT_THREADS = os.cpu_count() or 1
+MAX_BODY_BYTES = int(os.environ.get("QRGEN_MAX_BODY") or 32 * 1024 * 1024)
+SPOOL_MEMORY_BYTES = 1024 * 1024  # larger request bodies are spooled to disk
+
+
+class _Disconnected(Exception):
+    pass
+
+
+class _BodyTooLarge(Exception):
+    pass
+
+
+class WSGIBridge:
+    """ASGI app that runs a WSGI app on a bounded thread pool."""
+
+    def __init__(self, wsgi_app, threads=DEFAULT_THREADS, max_pending=None, warm_up=None, shut_down=None):
+        self.wsgi_app = wsgi_app
+        self.threads = threads
+        self.max_pending = max_pending or threads * 16
+        self.warm_up = warm_up
+        self.shut_down = shut_down
+        self._pool = None
+        self._slots = None
+
+    def _start(self):
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="qrgen-render")
+            self._slots = asyncio.Semaphore(self.threads + self.max_pending)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            self._start()
+            await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        loop = asyncio.get_running_loop()
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                self._start()
+                if self.warm_up is not None:
+                    await loop.run_in_executor(self._pool, self.warm_up)
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self._pool is not None:
+                    if self.shut_down is not None:
+                        await loop.run_in_executor(self._pool, self.shut_down)
+                    self._pool.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    # --- Requests ---
+    async def _http(self, scope, receive, send):
+        try:
+            body = await _read_body(receive)
+        except _Disconnected:
+            return
+        except _BodyTooLarge:
+            await _send_simple(send, 413, b"Request body too large")
+            return
+
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()  # every step of one request runs in the same context
+
+        def run(func, *args):
+            return loop.run_in_executor(self._pool, context.run, func, *args)
+
+        chunks = None
+        async with self._slots:
+            try:
+                status, headers, chunks, first = await run(self._call_app, _environ(scope, body))
+                await send({"type": "http.response.start", "status": status, "headers": headers})
+                chunk = first
+                while chunk is not None:
+                    if chunk:
+                        await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                    chunk = await run(next, chunks, None)
+                await send({"type": "http.response.body", "body": b""})
+            finally:
+                # close() runs Flask's teardown, which must see the request's context
+                if hasattr(chunks, "close"):
+                    await run(chunks.close)
+                body.close()
+
+    def _call_app(self, environ):
+        # Runs on a render thread; returns the status, headers and the first body chunk in one hop
+        response = []
+
+        def start_response(status, headers, exc_info=None):
+            response[:] = [int(status.split(" ", 1)[0]), headers]
+
+        iterable = self.wsgi_app(environ, start_response)
+        chunks = iter(iterable)
+        first = next(chunks, None)
+        if hasattr(iterable, "close") and iterable is not chunks:
+            chunks = _Closing(chunks, iterable.close)
+        status, headers = response
+        raw_headers = [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers]
+        return status, raw_headers, chunks, first
+
+
+class _Closing:
+    """An iterator that also carries the WSGI iterable's close()."""
+
+    def __init__(self, iterator, close):
+        self._iterator = iterator
+        self.close = close
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._iterator)
+
+
+async def _read_body(receive):
+    loop = asyncio.get_running_loop()
+    body = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_BYTES)
+    size = 0
+    more = True
+    try:
+        while more:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                raise _Disconnected()
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > MAX_BODY_BYTES:
+                raise _BodyTooLarge()
+            if size > SPOOL_MEMORY_BYTES:
+                await loop.run_in_executor(None, body.write, chunk)  # on disk now: keep writes off the loop
+            else:
+                body.write(chunk)
+            more = message.get("more_body", False)
+    except BaseException:
+        body.close()
+        raise
+    body.seek(0)
+    return body
+
+
+async def _send_simple(send, status, text):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"text/plain; charset=utf-8"), (b"content-length", str(len(text)).encode())],
+    })
+    await send({"type": "http.response.body", "body": text})
+
+
+def _environ(scope, body):
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode().decode("latin-1"),
+        "PATH_INFO": scope["path"].encode().decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1] or 80),
+        "SERVER_PROTOCOL": "HTTP/" + scope.get("http_version", "1.1"),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": body,
+        "wsgi.input_terminated": True,  # the body is complete, even for chunked requests
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    if scope.get("client"):
+        environ["REMOTE_ADDR"], environ["REMOTE_PORT"] = scope["client"][0], str(scope["client"][1])
+    for raw_name, raw_value in scope.get("headers", ()):
+        name = raw_name.decode("latin-1").upper().replace("-", "_")
+        value = raw_value.decode("latin-1")
+        if name == "CONTENT_TYPE" or name == "CONTENT_LENGTH":
+            key = name
+        else:
+            key = "HTTP_" + name
+        if key in environ:
+            value = environ[key] + ("; " if key == "HTTP_COOKIE" else ",") + value
+        environ[key] = value
+    return environ
+
+
+app = WSGIBridge(
+    QR_GEN.app,
+    threads=int(os.environ.get("QRGEN_RENDER_THREADS") or DEFAULT_THREADS),
+    warm_up=QR_GEN.warm_up,
+    shut_down=QR_GEN.shut_down,
+)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the QR generator from an asyncio event loop.")
+    parser.add_argument("--bind", default=DEFAULT_BIND, help=f"host:port to listen on (default: {DEFAULT_BIND})")
+    parser.add_argument("-t", "--threads", type=int, default=app.threads,
+                        help=f"render threads (default: QRGEN_RENDER_THREADS or all cores, {app.threads})")
+    args = parser.parse_args(argv)
+    try:
+        import uvicorn
+    except ImportError:
+        print("qr_asgi needs an ASGI server: pip install uvicorn", file=sys.stderr)
+        return 2
+    app.threads = args.threads
+    app.max_pending = args.threads * 16
+    host, port = qr_serve.parse_bind(args.bind)
+    uvicorn.run(app, host=host, port=port, lifespan="on")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""Bulk card renderer.
+
+Reads one card spec per CSV row / JSONL line (same fields as the web form: name, message, copy_data,
+image_url, text_key, link1..link3, custom_text, box_size, error_level, and optionally mask 0-7),
+renders every card on a render_farm pool of pre-warmed workers and writes numbered PNGs (or --format svg/jpeg/webp) plus
+manifest.csv into the output directory.
+
+    python qr_batch.py people.csv -o cards/ --workers 8
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+
+import QR_GEN
+import render_farm
+
+MANIFEST_FIELDS = ("index", "file", "name", "url", "version", "bytes", "error")
+
+
+# --- Input ---
+def read_specs(path):
+    """Yield card specs lazily from a .csv or .jsonl/.json-lines file ('-' reads JSONL from stdin)."""
+    if path == "-":
+        yield from _read_jsonl(sys.stdin)
+        return
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith(".csv"):
+            yield from csv.DictReader(f)
+        else:
+            yield from _read_jsonl(f)
+
+
+class RowError(ValueError):
+    """Stands in for an input line that could not be parsed; it becomes an error row in the manifest."""
+
+
+def _read_jsonl(f):
+    for line_number, line in enumerate(f, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            yield RowError(f"line {line_number}: {e}")
+
+
+# --- Worker ---
+def _render_job(job):
+    index, row, out_dir, fmt, layout, profile = job
+    result = {"index": index, "file": "", "name": "", "url": "", "version": "", "bytes": 0, "error": ""}
+    try:
+        if isinstance(row, RowError):
+            raise row
+        spec = QR_GEN.normalize_spec(row)
+        result["name"] = spec["name"]
+        result["url"], data, result["version"] = QR_GEN.render_spec(spec, fmt, layout, profile)
+        result["file"] = QR_GEN.card_filename(index, spec, fmt)
+        with open(os.path.join(out_dir, result["file"]), "wb") as f:
+            f.write(data)
+        result["bytes"] = len(data)
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    return result
+
+
+def _render_chunk(jobs):
+    return [_render_job(job) for job in jobs]
+
+
+def _chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+# --- Driver ---
+def run_batch(rows, out_dir, workers=None, chunksize=8, fmt="png", layout="card", profile="balanced"):
+    """Render rows on a render farm; writes card files and manifest.csv, returns (rendered, failed)."""
+    os.makedirs(out_dir, exist_ok=True)
+    jobs = ((index, row, out_dir, fmt, layout, profile) for index, row in enumerate(rows, start=1))
+    rendered = failed = 0
+    with open(os.path.join(out_dir, "manifest.csv"), "w", newline="", encoding="utf-8") as manifest_file, \
+            render_farm.RenderFarm(workers, initializer=QR_GEN.warm_up_renderer) as farm:
+        manifest = csv.DictWriter(manifest_file, fieldnames=MANIFEST_FIELDS)
+        manifest.writeheader()
+        # imap keeps manifest rows in input order while workers run ahead; workers write the files themselves
+        for results in farm.imap(_render_chunk, _chunked(jobs, chunksize)):
+            for result in results:
+                manifest.writerow(result)
+                if result["error"]:
+                    failed += 1
+                else:
+                    rendered += 1
+    return rendered, failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render QR cards in bulk from a CSV or JSONL file.")
+    parser.add_argument("input", help="CSV or JSONL file with one card per row ('-' for JSONL on stdin)")
+    parser.add_argument("-o", "--out", default="cards", help="output directory (default: cards)")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count(), help="worker processes (default: all cores)")
+    parser.add_argument("--chunksize", type=int, default=8, help="rows handed to a worker at a time")
+    parser.add_argument("-f", "--format", default="png", choices=sorted(QR_GEN.IMAGE_FORMATS), help="output format (default: png)")
+    parser.add_argument("--layout", default="card", choices=QR_GEN.LAYOUTS, help="full card or bare QR (default: card)")
+    parser.add_argument("--profile", default="small", choices=sorted(QR_GEN.PNG_PROFILES),
+                        help="PNG encoding profile (default: small, for archival print runs)")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    rendered, failed = run_batch(
+        read_specs(args.input), args.out, workers=args.workers, chunksize=args.chunksize,
+        fmt=args.format, layout=args.layout, profile=args.profile
+    )
+    elapsed = time.perf_counter() - start
+    rate = rendered / elapsed if elapsed else 0.0
+    print(f"Rendered {rendered} cards ({failed} failed) in {elapsed:.2f}s, {rate:.1f} cards/s -> {args.out}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
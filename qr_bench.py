@@ -0,0 +1,247 @@
+"""Per-stage render benchmarks.
+
+Times every stage of the card pipeline separately over a deterministic corpus of card specs (short
+and long names, 0-3 links, all four error levels, several box sizes, with and without a custom
+background) and writes the results as JSON. With --baseline, compares medians against an earlier
+run and exits 1 when a stage got slower than the allowed threshold.
+
+    python qr_bench.py -o bench.json
+    python qr_bench.py --baseline bench.json --threshold 0.15 --stage-threshold png_small=0.3
+"""
+import argparse
+import base64
+import datetime
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from importlib import metadata
+
+import numpy as np
+import PIL
+import qrcode
+from PIL import Image
+
+import QR_GEN
+
+DEFAULT_THRESHOLD = 0.10  # allowed slowdown of a stage's median before it counts as a regression
+
+# --- Corpus ---
+NAMES = ("Ana", "Maria Fernanda de los Santos Oliveira-Cavalcanti")
+MESSAGES = ("Hi!", "Thanks for stopping by - here is everything you need to reach me, any time of day.")
+LINKS = (
+    "https://wa.me/919876543210?text=Hello%20from%20the%20card",
+    "https://www.linkedin.com/in/maria-fernanda-santos-0123456789/",
+    "tel:+14155550123",
+)
+ERROR_LEVELS = ("L", "M", "Q", "H")
+BOX_SIZES = (4, 6, 10)
+
+
+def build_corpus(size=48, seed=1):
+    """Deterministic sample of card specs covering every corpus dimension; each has a 'background' flag."""
+    combos = list(itertools.product(
+        range(len(NAMES)), range(len(LINKS) + 1), ERROR_LEVELS, BOX_SIZES, (False, True)
+    ))
+    rng = random.Random(seed)
+    picked = combos if size >= len(combos) else rng.sample(combos, size)
+    corpus = []
+    for name_index, link_count, error_level, box_size, background in picked:
+        row = {
+            "name": NAMES[name_index],
+            "message": MESSAGES[name_index],
+            "image_url": "https://example.com/avatars/%d.jpg" % rng.randrange(10000) if name_index else "",
+            "custom_text": "" if rng.random() < 0.5 else "Scan to connect",
+            "box_size": box_size,
+            "error_level": error_level,
+        }
+        for i in range(link_count):
+            row[f"link{i + 1}"] = LINKS[i]
+        spec = QR_GEN.normalize_spec(row)
+        spec["background"] = background
+        corpus.append(spec)
+    return corpus
+
+
+def make_background(path, width=1200, height=1600):
+    gradient = np.linspace(0, 255, width, dtype=np.uint8)
+    pixels = np.empty((height, width, 3), dtype=np.uint8)
+    pixels[..., 0] = gradient
+    pixels[..., 1] = gradient[::-1]
+    pixels[..., 2] = np.linspace(64, 192, height, dtype=np.uint8)[:, None]
+    Image.fromarray(pixels).save(path, quality=90)
+    return path
+
+
+# --- Stages ---
+def run_pipeline(spec, background_path, timings):
+    """Run one spec through every stage once, appending each stage's duration (ns) to timings."""
+    def timed(stage, func, *args):
+        start = time.perf_counter_ns()
+        result = func(*args)
+        timings.setdefault(stage, []).append(time.perf_counter_ns() - start)
+        return result
+
+    bg = background_path if spec["background"] else None
+    qr_error = QR_GEN.ERROR_LEVELS.get(spec["error_level"], QR_GEN.DEFAULT_QR_ERROR)
+    total_start = time.perf_counter_ns()
+
+    url = timed("target_url", QR_GEN.generate_target_url, spec)
+    qr = timed("encode", QR_GEN.build_qr, url, spec["box_size"], qr_error)
+    card = timed("compose", QR_GEN.render_qr_card, qr, spec["custom_text"], bg)
+    png = timed("png_" + QR_GEN.DEFAULT_PNG_PROFILE, QR_GEN.encode_png, card, QR_GEN.DEFAULT_PNG_PROFILE)
+    with QR_GEN.app.test_request_context("/generate_qr", method="POST"):
+        timed("template", lambda: QR_GEN.render_page(
+            qr_image="/qr/bench.png", qr_version=qr.version, display_url=url, saved_data=spec
+        ))
+    timings.setdefault("total", []).append(time.perf_counter_ns() - total_start)
+
+    # Stages off the interactive path, timed for comparison
+    for profile in QR_GEN.PNG_PROFILES:
+        if profile != QR_GEN.DEFAULT_PNG_PROFILE:
+            timed("png_" + profile, QR_GEN.encode_png, card, profile)
+    timed("base64", base64.b64encode, png)
+    timed("encode_reference", _reference_encode, url, spec["box_size"], qr_error)
+    qr_img = timed("make_image", lambda: qr.make_image().get_image())
+    timed("add_custom_graphics", QR_GEN.add_custom_graphics, qr_img.convert("RGB"), spec["custom_text"], bg)
+
+
+def _reference_encode(url, box_size, qr_error):
+    # The stock qrcode encoder, as the app used before qr_encoder
+    qr = qrcode.QRCode(box_size=box_size, error_correction=qr_error)
+    qr.add_data(url)
+    qr.make(fit=True)
+    return qr
+
+
+def summarize(samples_ns):
+    samples = sorted(samples_ns)
+    us = [s / 1000 for s in samples]
+    return {
+        "n": len(us),
+        "min_us": round(us[0], 2),
+        "median_us": round(statistics.median(us), 2),
+        "mean_us": round(statistics.fmean(us), 2),
+        "p95_us": round(us[min(len(us) - 1, int(len(us) * 0.95))], 2),
+    }
+
+
+def run_benchmark(corpus_size=48, seed=1, repeat=5, stages=None):
+    corpus = build_corpus(corpus_size, seed)
+    timings = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        background_path = make_background(os.path.join(tmp, "background.jpg"))
+        QR_GEN.warm_up_renderer()
+        for spec in corpus:  # warm caches (backgrounds per card size, labels, layouts) before timing
+            run_pipeline(spec, background_path, {})
+        for _ in range(repeat):
+            for spec in corpus:
+                run_pipeline(spec, background_path, timings)
+    results = {stage: summarize(samples) for stage, samples in timings.items() if not stages or stage in stages}
+    return {"meta": _meta(corpus_size, seed, repeat), "stages": results}
+
+
+def _meta(corpus_size, seed, repeat):
+    return {
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "versions": {"numpy": np.__version__, "pillow": PIL.__version__, "qrcode": _qrcode_version()},
+        "corpus_size": corpus_size,
+        "seed": seed,
+        "repeat": repeat,
+    }
+
+
+def _qrcode_version():
+    try:
+        return metadata.version("qrcode")
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+# --- Baseline Comparison ---
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD, stage_thresholds=None):
+    """Rows of (stage, baseline median, current median, relative change, status); status is
+    "regression" when the median grew by more than the stage's threshold."""
+    stage_thresholds = stage_thresholds or {}
+    rows = []
+    for stage, current in results["stages"].items():
+        before = baseline.get("stages", {}).get(stage)
+        if not before:
+            rows.append((stage, None, current["median_us"], None, "new"))
+            continue
+        change = current["median_us"] / before["median_us"] - 1 if before["median_us"] else 0.0
+        limit = stage_thresholds.get(stage, threshold)
+        status = "regression" if change > limit else "faster" if change < -limit else "ok"
+        rows.append((stage, before["median_us"], current["median_us"], change, status))
+    return rows
+
+
+def print_table(results, rows=None):
+    if rows is None:
+        print(f"{'stage':<22}{'median us':>12}{'p95 us':>12}{'mean us':>12}")
+        for stage, s in results["stages"].items():
+            print(f"{stage:<22}{s['median_us']:>12.1f}{s['p95_us']:>12.1f}{s['mean_us']:>12.1f}")
+        return
+    print(f"{'stage':<22}{'baseline us':>12}{'current us':>12}{'change':>9}  status")
+    for stage, before, current, change, status in rows:
+        before_txt = f"{before:.1f}" if before is not None else "-"
+        change_txt = f"{change:+.1%}" if change is not None else "-"
+        print(f"{stage:<22}{before_txt:>12}{current:>12.1f}{change_txt:>9}  {status}")
+
+
+def _parse_stage_threshold(value):
+    stage, sep, limit = value.partition("=")
+    if not sep:
+        raise argparse.ArgumentTypeError("expected STAGE=FRACTION, e.g. png_small=0.3")
+    return stage, float(limit)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark each stage of the QR card pipeline.")
+    parser.add_argument("-o", "--output", help="write JSON results to this file ('-' for stdout)")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help=f"allowed median slowdown per stage, as a fraction (default: {DEFAULT_THRESHOLD})")
+    parser.add_argument("--stage-threshold", type=_parse_stage_threshold, action="append", default=[],
+                        metavar="STAGE=FRACTION", help="override the threshold for one stage (repeatable)")
+    parser.add_argument("-n", "--corpus-size", type=int, default=48, help="card specs in the corpus (default: 48)")
+    parser.add_argument("--seed", type=int, default=1, help="corpus sampling seed (default: 1)")
+    parser.add_argument("-r", "--repeat", type=int, default=5, help="timed passes over the corpus (default: 5)")
+    parser.add_argument("--stages", help="comma-separated stages to report (default: all)")
+    args = parser.parse_args(argv)
+
+    stages = set(args.stages.split(",")) if args.stages else None
+    results = run_benchmark(args.corpus_size, args.seed, args.repeat, stages)
+
+    if args.output == "-":
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    elif args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if not args.baseline:
+        if args.output != "-":
+            print_table(results)
+        return 0
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    rows = compare(results, baseline, args.threshold, dict(args.stage_threshold))
+    print_table(results, rows)
+    regressions = [row[0] for row in rows if row[4] == "regression"]
+    if regressions:
+        print(f"Regressed: {', '.join(regressions)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,442 @@
+from bisect import bisect_left
+from functools import lru_cache
+
+import numpy as np
+import qrcode
+from qrcode import base as qrcode_base
+from qrcode import main as qrcode_main
+from qrcode import util as qrcode_util
+from qrcode.exceptions import DataOverflowError
+
+MASK_PATTERNS = range(8)
+# Versions sharing one set of character-count field widths (qrcode.util.mode_sizes_for_version)
+VERSION_CLASSES = ((1, 9), (10, 26), (27, 40))
+
+# 1:1:3:1:1 finder-like pattern with four light modules on either side, as scored by qrcode
+_FINDER_PATTERNS = (0b10111010000, 0b00001011101)
+
+
+# --- Symbol Layout (cached per version) ---
+@lru_cache(maxsize=None)
+def _layout(version):
+    """Function patterns, the data-module mask and the data placement order for one version.
+
+    The template is laid out by qrcode itself (finder/alignment/timing patterns, with format and
+    version info reserved as light modules, as in qrcode's test layout) so the two always agree.
+    """
+    size = version * 4 + 17
+    probe = qrcode.QRCode(version=version)
+    probe.modules_count = size
+    if version not in qrcode_main.precomputed_qr_blanks:
+        probe.data_cache = []
+        probe.makeImpl(True, 0)
+    probe.modules = qrcode_main.copy_2d_array(qrcode_main.precomputed_qr_blanks[version])
+    probe.setup_type_info(True, 0)
+    if version >= 7:
+        probe.setup_type_number(True)
+
+    template = np.array([[bool(m) for m in row] for row in probe.modules])
+    free = np.array([[m is None for m in row] for row in probe.modules])
+    rows, cols = _placement_order(free)
+    masks = _mask_stack(size) & free
+    for arr in (template, free, rows, cols, masks):
+        arr.flags.writeable = False
+    return template, rows, cols, masks
+
+
+def _placement_order(free):
+    """Coordinates of the data modules in the zig-zag order QRCode.map_data fills them."""
+    size = free.shape[0]
+    rows, cols = [], []
+    upward = True
+    for col in range(size - 1, 0, -2):
+        if col <= 6:
+            col -= 1  # skip the vertical timing pattern
+        for row in (range(size - 1, -1, -1) if upward else range(size)):
+            for c in (col, col - 1):
+                if free[row, c]:
+                    rows.append(row)
+                    cols.append(c)
+        upward = not upward
+    return np.array(rows, dtype=np.intp), np.array(cols, dtype=np.intp)
+
+
+def _mask_stack(size):
+    """All eight mask patterns (qrcode.util.mask_func) as a (8, size, size) boolean array."""
+    i, j = np.indices((size, size))
+    return np.stack([
+        (i + j) % 2 == 0,
+        i % 2 == 0,
+        j % 3 == 0,
+        (i + j) % 3 == 0,
+        (i // 2 + j // 3) % 2 == 0,
+        (i * j) % 2 + (i * j) % 3 == 0,
+        ((i * j) % 2 + (i * j) % 3) % 2 == 0,
+        ((i * j) % 3 + (i + j) % 2) % 2 == 0,
+    ])
+
+
+@lru_cache(maxsize=None)
+def _type_info(version, error_correction, mask_pattern):
+    """Dark modules of the format (and, from version 7, version) information for a final symbol."""
+    size = version * 4 + 17
+    probe = qrcode.QRCode(version=version, error_correction=error_correction)
+    probe.modules_count = size
+    probe.modules = [[None] * size for _ in range(size)]
+    probe.setup_type_info(False, mask_pattern)
+    if version >= 7:
+        probe.setup_type_number(False)
+    info = np.array([[m is True for m in row] for row in probe.modules])
+    info.flags.writeable = False
+    return info
+
+
+def _data_bits(data, count):
+    bits = np.unpackbits(np.frombuffer(bytes(data), dtype=np.uint8))
+    if len(bits) >= count:
+        return bits[:count].astype(bool)
+    # Remainder bits past the end of the codewords stay light, as in map_data
+    return np.concatenate((bits.astype(bool), np.zeros(count - len(bits), dtype=bool)))
+
+
+# --- GF(256) Arithmetic (QR polynomial x^8 + x^4 + x^3 + x^2 + 1) ---
+def _gf_tables():
+    exp = np.zeros(512, dtype=np.int32)
+    value = 1
+    for i in range(255):
+        exp[i] = value
+        value <<= 1
+        if value & 0x100:
+            value ^= 0x11D
+    exp[255:510] = exp[:255]  # doubled so a sum of two logs never needs a modulo
+    log = np.zeros(256, dtype=np.int32)
+    log[exp[:255]] = np.arange(255)
+    return exp, log
+
+
+GF_EXP, GF_LOG = _gf_tables()
+GF_EXP.flags.writeable = GF_LOG.flags.writeable = False
+
+
+@lru_cache(maxsize=None)
+def generator_log(ec_count):
+    """Log-coefficients of the RS generator polynomial prod(x - a^i), leading term dropped."""
+    poly = [1]
+    for i in range(ec_count):
+        root = int(GF_EXP[i])
+        nxt = poly + [0]
+        for j, coef in enumerate(poly):
+            if coef:
+                nxt[j + 1] ^= int(GF_EXP[GF_LOG[coef] + GF_LOG[root]])
+        poly = nxt
+    logs = GF_LOG[np.array(poly[1:])]
+    logs.flags.writeable = False
+    return logs
+
+
+def rs_remainders(blocks: np.ndarray, ec_count) -> np.ndarray:
+    """Error-correction codewords for every row of a (blocks, data_len) uint8 array at once.
+
+    Long division by the generator, one data column per step, across all blocks in parallel.
+    Shorter blocks are left-padded with zeros, which leaves their remainder unchanged.
+    """
+    gen_log = generator_log(ec_count)
+    remainder = np.zeros((blocks.shape[0], ec_count), dtype=np.int32)
+    for column in blocks.T.astype(np.int32):
+        factor = column ^ remainder[:, 0]
+        remainder[:, :-1] = remainder[:, 1:]
+        remainder[:, -1] = 0
+        live = factor != 0
+        if live.any():
+            remainder[live] ^= GF_EXP[GF_LOG[factor[live]][:, None] + gen_log]
+    return remainder.astype(np.uint8)
+
+
+# --- Bit Stream ---
+class BitWriter:
+    """Append-only bit buffer: bits gather in an int and are flushed to a bytearray a byte at a time."""
+
+    def __init__(self):
+        self.data = bytearray()
+        self._acc = 0
+        self._pending = 0  # bits in _acc not yet flushed
+        self.length = 0
+
+    def put(self, value, length):
+        self._acc = (self._acc << length) | value
+        self._pending += length
+        self.length += length
+        if self._pending >= 8:
+            whole = self._pending // 8
+            self._pending -= whole * 8
+            self.data += (self._acc >> self._pending).to_bytes(whole, "big")
+            self._acc &= (1 << self._pending) - 1
+
+    def __len__(self):
+        return self.length
+
+    def getvalue(self) -> bytes:
+        """The written bits, zero-padded to a whole byte."""
+        if self._pending:
+            return bytes(self.data) + bytes([(self._acc << (8 - self._pending)) & 0xFF])
+        return bytes(self.data)
+
+
+def _segment_bits(segment):
+    """Payload bit length of a qrcode QRData segment (without the mode and length header)."""
+    count = len(segment.data)
+    if segment.mode == qrcode_util.MODE_NUMBER:
+        return 10 * (count // 3) + (0, 4, 7)[count % 3]
+    if segment.mode == qrcode_util.MODE_ALPHA_NUM:
+        return 11 * (count // 2) + 6 * (count % 2)
+    return 8 * count
+
+
+def _write_segment(writer, segment):
+    data = segment.data
+    if segment.mode == qrcode_util.MODE_NUMBER:
+        for i in range(0, len(data), 3):
+            chars = data[i:i + 3]
+            writer.put(int(chars), qrcode_util.NUMBER_LENGTH[len(chars)])
+    elif segment.mode == qrcode_util.MODE_ALPHA_NUM:
+        index = qrcode_util.ALPHA_NUM.find
+        for i in range(0, len(data) - 1, 2):
+            writer.put(index(data[i:i + 1]) * 45 + index(data[i + 1:i + 2]), 11)
+        if len(data) % 2:
+            writer.put(index(data[-1:]), 6)
+    else:
+        writer.put(int.from_bytes(data, "big"), 8 * len(data))
+
+
+# --- Segmentation ---
+_NUMERIC = frozenset(b"0123456789")
+_ALPHANUMERIC = frozenset(qrcode_util.ALPHA_NUM)
+_SEGMENT_MODES = (qrcode_util.MODE_NUMBER, qrcode_util.MODE_ALPHA_NUM, qrcode_util.MODE_8BIT_BYTE)
+_UNREACHABLE = 1 << 60
+
+
+@lru_cache(maxsize=256)
+def optimal_segments(data: bytes, version) -> tuple:
+    """Split data into numeric / alphanumeric / byte segments using the fewest bits at this version.
+
+    Dynamic programming over the characters: for every mode, the cheapest encoding of the prefix that
+    ends in that mode, where switching modes costs a fresh 4-bit mode indicator plus a character-count
+    field (whose width depends on the version class, hence the version argument). Costs are kept in
+    sixths of a bit so numeric (10/3 bits) and alphanumeric (11/2) characters stay integral.
+    """
+    if not data:
+        return ()
+    sizes = qrcode_util.mode_sizes_for_version(version)
+    h0, h1, h2 = ((4 + sizes[mode]) * 6 for mode in _SEGMENT_MODES)
+    c0, c1, c2 = h0, h1, h2
+    # came_from[i][m]: mode character i is coded in, on the cheapest path that is in mode m after it
+    came_from = []
+    for byte in data:
+        s0 = c0 + 20 if byte in _NUMERIC else _UNREACHABLE
+        s1 = c1 + 33 if byte in _ALPHANUMERIC else _UNREACHABLE
+        s2 = c2 + 48
+        # Cheapest place to close the current segment (rounded up to whole bits) and open another
+        end, end_mode = min((-(-s0 // 6) * 6, 0), (-(-s1 // 6) * 6, 1), (-(-s2 // 6) * 6, 2))
+        o0, o1, o2 = 0, 1, 2
+        if end + h0 < s0:
+            s0, o0 = end + h0, end_mode
+        if end + h1 < s1:
+            s1, o1 = end + h1, end_mode
+        if end + h2 < s2:
+            s2, o2 = end + h2, end_mode
+        c0, c1, c2 = s0, s1, s2
+        came_from.append((o0, o1, o2))
+
+    costs = (c0, c1, c2)
+    mode = min(range(3), key=lambda m: costs[m])
+    char_modes = bytearray(len(data))
+    for i in range(len(data) - 1, -1, -1):
+        mode = came_from[i][mode]
+        char_modes[i] = mode
+
+    segments = []
+    start = 0
+    for i in range(1, len(data) + 1):
+        if i == len(data) or char_modes[i] != char_modes[start]:
+            mode = _SEGMENT_MODES[char_modes[start]]
+            # Respect the count field's range; a run this long never pays off within one class anyway
+            longest = (1 << sizes[mode]) - 1
+            for chunk_start in range(start, i, longest):
+                chunk = data[chunk_start:min(i, chunk_start + longest)]
+                segments.append(qrcode_util.QRData(chunk, mode=mode, check_data=False))
+            start = i
+    return tuple(segments)
+
+
+# --- Capacity ---
+def fit_version(segments_for, error_correction, start=1) -> int:
+    """Smallest version >= start that holds the data, read straight off the capacity table.
+
+    segments_for(version) returns the segments to encode at that version's count-field widths.
+    """
+    limits = qrcode_util.BIT_LIMIT_TABLE[error_correction]
+    for first, last in VERSION_CLASSES:
+        if last < start:
+            continue
+        sizes = qrcode_util.mode_sizes_for_version(first)
+        needed = sum(4 + sizes[segment.mode] + _segment_bits(segment) for segment in segments_for(first))
+        version = bisect_left(limits, needed, max(first, start), last + 1)
+        if version <= last:
+            return version
+    # Same exception type qrcode ends up raising when it runs past version 40
+    raise ValueError(f"Data needs {needed} bits; a version 40 symbol at this error level holds {limits[40]}")
+
+
+@lru_cache(maxsize=None)
+def _block_layout(version, error_correction):
+    """(data codewords per block, EC codewords per block) for one version and level."""
+    blocks = qrcode_base.rs_blocks(version, error_correction)
+    return tuple(block.data_count for block in blocks), blocks[0].total_count - blocks[0].data_count
+
+
+def encode_data(version, error_correction, segments) -> bytes:
+    """Final interleaved codewords for a symbol; byte-for-byte the same as qrcode.util.create_data."""
+    data_counts, ec_count = _block_layout(version, error_correction)
+    bit_limit = 8 * sum(data_counts)
+    sizes = qrcode_util.mode_sizes_for_version(version)
+    writer = BitWriter()
+    for segment in segments:
+        writer.put(segment.mode, 4)
+        writer.put(len(segment.data), sizes[segment.mode])
+        _write_segment(writer, segment)
+    if len(writer) > bit_limit:
+        raise DataOverflowError(
+            "Code length overflow. Data size (%s) > size available (%s)" % (len(writer), bit_limit)
+        )
+    writer.put(0, min(bit_limit - len(writer), 4))  # terminator
+    stream = writer.getvalue()
+    pad_count = bit_limit // 8 - len(stream)
+    stream += (bytes((qrcode_util.PAD0, qrcode_util.PAD1)) * (pad_count // 2 + 1))[:pad_count]
+
+    # Blocks differ by at most one data codeword; right-aligned rows let one division serve them all
+    longest = max(data_counts)
+    blocks = np.zeros((len(data_counts), longest), dtype=np.uint8)
+    present = np.zeros((len(data_counts), longest), dtype=bool)
+    codewords = np.frombuffer(stream, dtype=np.uint8)
+    offset = 0
+    for row, count in enumerate(data_counts):
+        blocks[row, longest - count:] = codewords[offset:offset + count]
+        present[row, :count] = True
+        offset += count
+    ec = rs_remainders(blocks, ec_count)
+
+    # Interleave: data codewords column by column (skipping gaps of short blocks), then EC codewords
+    left_aligned = np.zeros_like(blocks)
+    for row, count in enumerate(data_counts):
+        left_aligned[row, :count] = blocks[row, longest - count:]
+    return left_aligned.T[present.T].tobytes() + ec.T.tobytes()
+
+
+# --- Penalty Rules ---
+def _run_penalty(symbols):
+    """Rule 1 along the last axis: every run of >= 5 same-coloured modules scores length - 2."""
+    count, rows, size = symbols.shape
+    # A sentinel column (2) between rows keeps runs from spilling into the next row
+    flat = np.full((count, rows, size + 1), 2, dtype=np.int8)
+    flat[:, :, 1:] = symbols
+    flat = flat.ravel()
+    starts = np.flatnonzero(np.concatenate(([True], flat[1:] != flat[:-1])))
+    lengths = np.diff(np.append(starts, len(flat)))
+    long_runs = lengths >= 5
+    owner = starts[long_runs] // (rows * (size + 1))
+    return np.bincount(owner, weights=lengths[long_runs] - 2, minlength=count).astype(np.int64)
+
+
+def _block_penalty(symbols):
+    """Rule 2: 3 points per 2x2 block of one colour (overlapping blocks all count)."""
+    top_left = symbols[:, :-1, :-1]
+    same = (
+        (top_left == symbols[:, :-1, 1:])
+        & (top_left == symbols[:, 1:, :-1])
+        & (top_left == symbols[:, 1:, 1:])
+    )
+    return 3 * same.sum(axis=(1, 2))
+
+
+def _finder_penalty(symbols):
+    """Rule 3 along the last axis: 40 points per 11-module window matching a finder-like pattern."""
+    # Read every 11-module window as an 11-bit number: shift-and-add the symbol against itself
+    bits = symbols.astype(np.int16)
+    width = bits.shape[2] - 10
+    codes = bits[:, :, :width] << 10
+    for k in range(1, 11):
+        codes |= bits[:, :, k:k + width] << (10 - k)
+    hits = (codes == _FINDER_PATTERNS[0]) | (codes == _FINDER_PATTERNS[1])
+    return 40 * hits.sum(axis=(1, 2))
+
+
+def _balance_penalty(symbols):
+    """Rule 4: 10 points per 5% the dark-module ratio departs from 50%."""
+    total = symbols.shape[1] * symbols.shape[2]
+    dark = symbols.sum(axis=(1, 2))
+    return np.array([int(abs(float(d) / total * 100 - 50) / 5) * 10 for d in dark], dtype=np.int64)
+
+
+def penalties(symbols: np.ndarray) -> np.ndarray:
+    """Score a stack of (n, size, size) symbols with qrcode.util.lost_point's rules, all at once."""
+    columns = symbols.transpose(0, 2, 1)
+    return (
+        _run_penalty(symbols) + _run_penalty(columns)
+        + _block_penalty(symbols)
+        + _finder_penalty(symbols) + _finder_penalty(columns)
+        + _balance_penalty(symbols)
+    )
+
+
+# --- QRCode ---
+class QRCode(qrcode.QRCode):
+    """qrcode.QRCode with a table-driven encoder and a NumPy layout that scores all eight masks at once.
+
+    Text given to add_data() is split into mixed-mode segments with optimal_segments() (qrcode only
+    breaks out runs of 20+ characters), so long URLs can land one or two versions lower. Explicit
+    QRData objects and optimize=0 are encoded as given. Pass mask_pattern to pin a mask and skip the
+    evaluation. The finished symbol is also kept as a boolean array in .matrix.
+    """
+
+    matrix = None
+
+    def clear(self):
+        super().clear()
+        self.payload = b""
+
+    def add_data(self, data, optimize=20):
+        if isinstance(data, qrcode_util.QRData) or not optimize:
+            super().add_data(data, optimize)
+            return
+        # Segmented as a whole once the version class is known; follows any explicit QRData
+        self.payload += qrcode_util.to_bytestring(data)
+        self.data_cache = None
+
+    def segments(self, version):
+        return list(self.data_list) + list(optimal_segments(self.payload, version))
+
+    def best_fit(self, start=None):
+        self.version = fit_version(self.segments, self.error_correction, start or 1)
+        return self.version
+
+    def _data_symbol(self):
+        template, rows, cols, _ = _layout(self.version)
+        if self.data_cache is None:
+            self.data_cache = encode_data(self.version, self.error_correction, self.segments(self.version))
+        symbol = template.copy()
+        symbol[rows, cols] = _data_bits(self.data_cache, len(rows))
+        return symbol
+
+    def best_mask_pattern(self):
+        _, _, _, masks = _layout(self.version)
+        symbols = self._data_symbol() ^ masks  # test layout under every mask: (8, size, size)
+        return int(np.argmin(penalties(symbols)))
+
+    def makeImpl(self, test, mask_pattern):
+        _, _, _, masks = _layout(self.version)
+        matrix = self._data_symbol() ^ masks[mask_pattern]
+        if not test:
+            matrix |= _type_info(self.version, self.error_correction, mask_pattern)
+        self.modules_count = matrix.shape[0]
+        self.matrix = matrix
+        self.modules = matrix.tolist()
@@ -0,0 +1,430 @@
+"""Load generator for the QR web app.
+
+Starts the app locally (Flask's threaded dev server, or qr_serve's prefork server) or targets one
+that is already running, drives a weighted mix of /, /generate_qr (optionally with a multipart
+background upload) and /download_qr from concurrent virtual users, and reports throughput,
+p50/p95/p99 latency, error rate and the RSS of every server process.
+
+    python qr_loadtest.py --server dev -c 8 -d 30
+    python qr_loadtest.py --server prefork --workers 4 --threads 8 -c 32 -d 60
+    python qr_loadtest.py --url http://127.0.0.1:5000 --pid 12345 --mix index=1,generate=4,download=3
+
+Each virtual user keeps its own keep-alive connection and session cookie, so downloads fetch the
+card that user generated last.
+"""
+import argparse
+import http.client
+import io
+import json
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+import uuid
+
+import numpy as np
+from PIL import Image
+
+DEFAULT_MIX = {"index": 1, "generate": 4, "upload": 1, "download": 3}
+SESSION_COOKIE = "qrgen_sid"
+READY_TIMEOUT = 60
+RSS_INTERVAL = 0.5
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+NAMES = ("Ana", "Rahul Sharma", "Maria Fernanda de los Santos", "Li Wei", "Jonathan Example")
+LINKS = (
+    "https://wa.me/919876543210",
+    "https://www.linkedin.com/in/someone-0123456789/",
+    "https://github.com/someone",
+    "tel:+14155550123",
+)
+
+
+# --- Server Under Test ---
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(kind, port, workers=2, threads=8):
+    """Launch the app in a child process: 'dev' (Flask's threaded server) or 'prefork' (qr_serve)."""
+    if kind == "dev":
+        cmd = [sys.executable, "-c",
+               f"import QR_GEN; QR_GEN.app.run(host='127.0.0.1', port={port}, threaded=True)"]
+    else:
+        cmd = [sys.executable, os.path.join(APP_DIR, "qr_serve.py"), "--bind", f"127.0.0.1:{port}",
+               "--workers", str(workers), "--threads", str(threads)]
+    return subprocess.Popen(cmd, cwd=APP_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def stop_server(proc, timeout=30):
+    proc.send_signal(signal.SIGTERM)
+    try:
+        proc.wait(timeout)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+
+def wait_ready(host, port, timeout=READY_TIMEOUT):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=5)
+            conn.request("GET", "/")
+            if conn.getresponse().status == 200:
+                conn.close()
+                return True
+        except OSError:
+            pass
+        time.sleep(0.2)
+    return False
+
+
+# --- Process Memory (Linux /proc) ---
+def process_tree(pid):
+    """pid and all of its descendants."""
+    pids, queue = [], [pid]
+    while queue:
+        current = queue.pop()
+        pids.append(current)
+        try:
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as f:
+                    queue.extend(int(child) for child in f.read().split())
+        except OSError:
+            continue
+    return pids
+
+
+def rss_kib(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+class RssSampler(threading.Thread):
+    """Samples the RSS of a process tree in the background; keeps the peak and last value per pid."""
+
+    def __init__(self, pid, interval=RSS_INTERVAL):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.peak = {}
+        self.last = {}
+        self._stop_event = threading.Event()
+
+    def sample(self):
+        for pid in process_tree(self.pid):
+            rss = rss_kib(pid)
+            if rss is not None:
+                self.last[pid] = rss
+                self.peak[pid] = max(rss, self.peak.get(pid, 0))
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.sample()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        self.sample()
+
+
+# --- Payloads ---
+def make_backgrounds(count, width=900, height=1200, seed=0):
+    """Distinct PNG backgrounds, so content-addressed upload dedup does not hide the decode cost."""
+    rng = np.random.default_rng(seed)
+    images = []
+    for _ in range(count):
+        tint = rng.integers(0, 256, size=3)
+        x = np.linspace(0, 1, width)[None, :, None]
+        y = np.linspace(0, 1, height)[:, None, None]
+        pixels = ((x * 0.6 + y * 0.4) * tint).astype(np.uint8)
+        buf = io.BytesIO()
+        Image.fromarray(np.broadcast_to(pixels, (height, width, 3)).copy()).save(buf, format="PNG")
+        images.append(buf.getvalue())
+    return images
+
+
+def random_form(rng):
+    form = {
+        "name": rng.choice(NAMES),
+        "message": "Check out my profile!",
+        "box_size": str(rng.choice((4, 6, 8, 10))),
+        "error_level": rng.choice("LMQH"),
+    }
+    for i, link in enumerate(rng.sample(LINKS, rng.randint(0, 3)), start=1):
+        form[f"link{i}"] = link
+    return form
+
+
+def multipart(fields, file_field, filename, data, content_type="image/png"):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+        )
+    parts.append(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{file_field}"; filename="{filename}"\r\n'
+        f"Content-Type: {content_type}\r\n\r\n".encode() + data + b"\r\n"
+    )
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+# --- Virtual Users ---
+class VirtualUser(threading.Thread):
+    def __init__(self, host, port, mix, backgrounds, results, budget, seed):
+        super().__init__(daemon=True)
+        self.host, self.port = host, port
+        self.actions, self.weights = zip(*mix.items())
+        self.backgrounds = backgrounds
+        self.results = results  # shared list of (action, status, seconds); list.append is atomic
+        self.budget = budget
+        self.rng = random.Random(seed)
+        self.conn = None
+        self.cookie = ""
+        self.generated = False
+
+    def run(self):
+        while self.budget.take():
+            action = self.rng.choices(self.actions, self.weights)[0]
+            if action == "download" and not self.generated:
+                action = "generate"  # a session needs a card before it can download one
+            getattr(self, "do_" + action)()
+        if self.conn is not None:
+            self.conn.close()
+
+    def request(self, action, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        if self.cookie:
+            headers["Cookie"] = f"{SESSION_COOKIE}={self.cookie}"
+        start = time.perf_counter()
+        status = 0
+        for attempt in range(2):
+            try:
+                if self.conn is None:
+                    self.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+                self.conn.request(method, path, body=body, headers=headers)
+                response = self.conn.getresponse()
+                response.read()
+                status = response.status
+                self._remember_cookie(response)
+                if response.will_close:
+                    self.conn.close()
+                    self.conn = None
+                break
+            except (OSError, http.client.HTTPException):
+                # The server may drop an idle keep-alive connection; retry once on a fresh one
+                if self.conn is not None:
+                    self.conn.close()
+                self.conn = None
+                if attempt:
+                    status = 0
+        self.results.append((action, status, time.perf_counter() - start))
+        return status
+
+    def _remember_cookie(self, response):
+        for header in response.headers.get_all("Set-Cookie") or ():
+            name, _, rest = header.partition("=")
+            if name.strip() == SESSION_COOKIE:
+                self.cookie = rest.split(";", 1)[0]
+
+    def do_index(self):
+        if self.request("index", "GET", "/") == 200:
+            self.generated = False  # the form page starts a fresh card for the session
+
+    def do_generate(self):
+        body = urllib.parse.urlencode(random_form(self.rng))
+        status = self.request("generate", "POST", "/generate_qr", body,
+                              {"Content-Type": "application/x-www-form-urlencoded"})
+        self.generated = self.generated or status == 200
+
+    def do_upload(self):
+        body, content_type = multipart(
+            random_form(self.rng), "background_image_file", "background.png", self.rng.choice(self.backgrounds)
+        )
+        status = self.request("upload", "POST", "/generate_qr", body, {"Content-Type": content_type})
+        self.generated = self.generated or status == 200
+
+    def do_download(self):
+        self.request("download", "GET", "/download_qr")
+
+
+class Budget:
+    """Stops the run after a deadline and/or a total number of requests."""
+
+    def __init__(self, duration=None, requests=None):
+        self.deadline = time.monotonic() + duration if duration else None
+        self.remaining = requests
+        self._lock = threading.Lock()
+
+    def take(self):
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            return False
+        if self.remaining is None:
+            return True
+        with self._lock:
+            if self.remaining <= 0:
+                return False
+            self.remaining -= 1
+            return True
+
+
+# --- Report ---
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+
+def summarize(samples, elapsed):
+    latencies = sorted(seconds * 1000 for _, _, seconds in samples)
+    errors = sum(1 for _, status, _ in samples if not 200 <= status < 400)
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "error_rate": round(errors / len(samples), 4) if samples else 0.0,
+        "throughput_rps": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "max_ms": round(latencies[-1], 2) if latencies else 0.0,
+    }
+
+
+def build_report(results, elapsed, sampler, config):
+    by_action = {}
+    for sample in results:
+        by_action.setdefault(sample[0], []).append(sample)
+    report = {
+        "config": config,
+        "elapsed_s": round(elapsed, 2),
+        "overall": summarize(results, elapsed),
+        "endpoints": {action: summarize(samples, elapsed) for action, samples in sorted(by_action.items())},
+    }
+    if sampler is not None:
+        report["rss_mib"] = {
+            str(pid): {"peak": round(sampler.peak[pid] / 1024, 1), "last": round(sampler.last.get(pid, 0) / 1024, 1)}
+            for pid in sorted(sampler.peak)
+        }
+        report["rss_total_peak_mib"] = round(sum(sampler.peak.values()) / 1024, 1)
+    return report
+
+
+def print_report(report):
+    overall = report["overall"]
+    print(f"{overall['requests']} requests in {report['elapsed_s']}s: {overall['throughput_rps']} req/s, "
+          f"error rate {overall['error_rate']:.2%}")
+    print(f"{'endpoint':<10}{'requests':>9}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for action, s in list(report["endpoints"].items()) + [("all", overall)]:
+        print(f"{action:<10}{s['requests']:>9}{s['errors']:>8}{s['throughput_rps']:>9.1f}"
+              f"{s['p50_ms']:>9.1f}{s['p95_ms']:>9.1f}{s['p99_ms']:>9.1f}{s['max_ms']:>9.1f}")
+    if "rss_mib" in report:
+        print("RSS (MiB): " + ", ".join(f"pid {pid} peak {v['peak']} last {v['last']}"
+                                        for pid, v in report["rss_mib"].items()))
+        print(f"RSS total peak: {report['rss_total_peak_mib']} MiB")
+    elif report["config"].get("pid"):
+        print("RSS: unavailable (needs Linux /proc)")
+
+
+def parse_mix(text):
+    mix = {}
+    for item in text.split(","):
+        action, _, weight = item.partition("=")
+        action = action.strip()
+        if action not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"unknown action '{action}' (choose from {', '.join(DEFAULT_MIX)})")
+        mix[action] = float(weight or 1)
+    if not any(mix.values()):
+        raise argparse.ArgumentTypeError("the mix needs at least one action with a positive weight")
+    return mix
+
+
+def run(host, port, concurrency, mix, duration=None, requests=None, pid=None, upload_variants=8, seed=0):
+    backgrounds = make_backgrounds(upload_variants, seed=seed) if mix.get("upload") else []
+    sampler = RssSampler(pid) if pid and os.path.isdir("/proc") else None
+    if sampler is not None:
+        sampler.sample()
+        sampler.start()
+    results = []
+    budget = Budget(duration, requests)
+    users = [VirtualUser(host, port, mix, backgrounds, results, budget, seed + i) for i in range(concurrency)]
+    start = time.perf_counter()
+    for user in users:
+        user.start()
+    for user in users:
+        user.join()
+    elapsed = time.perf_counter() - start
+    if sampler is not None:
+        sampler.stop()
+    config = {"host": host, "port": port, "concurrency": concurrency, "mix": mix,
+              "duration": duration, "requests": requests, "pid": pid}
+    return build_report(results, elapsed, sampler, config)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Drive the QR web app with a concurrent request mix.")
+    parser.add_argument("--server", choices=("dev", "prefork", "none"), default="dev",
+                        help="start the app locally with Flask's threaded server or qr_serve, or 'none' "
+                             "to target --url (default: dev)")
+    parser.add_argument("--url", help="base URL of a running server (with --server none)")
+    parser.add_argument("--pid", type=int, help="server process to sample RSS from (with --server none)")
+    parser.add_argument("--workers", type=int, default=2, help="prefork worker processes (default: 2)")
+    parser.add_argument("--threads", type=int, default=8, help="prefork threads per worker (default: 8)")
+    parser.add_argument("-c", "--concurrency", type=int, default=8, help="virtual users (default: 8)")
+    parser.add_argument("-d", "--duration", type=float, help="seconds to run (default: 20 unless -n is given)")
+    parser.add_argument("-n", "--requests", type=int, help="stop after this many requests")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX,
+                        help="weighted actions, e.g. index=1,generate=4,upload=1,download=3")
+    parser.add_argument("--upload-variants", type=int, default=8, help="distinct background images to upload")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the report as JSON to this file")
+    args = parser.parse_args(argv)
+    if args.duration is None and args.requests is None:
+        args.duration = 20
+
+    proc = None
+    if args.server == "none":
+        if not args.url:
+            parser.error("--server none needs --url")
+        target = urllib.parse.urlsplit(args.url)
+        host, port, pid = target.hostname, target.port or 80, args.pid
+    else:
+        host, port = "127.0.0.1", free_port()
+        proc = start_server(args.server, port, args.workers, args.threads)
+        pid = proc.pid
+    try:
+        if not wait_ready(host, port):
+            print(f"Server at {host}:{port} did not become ready", file=sys.stderr)
+            return 2
+        report = run(host, port, args.concurrency, args.mix, args.duration, args.requests, pid,
+                     args.upload_variants, args.seed)
+    finally:
+        if proc is not None:
+            stop_server(proc)
+
+    report["config"]["server"] = args.server
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 1 if report["overall"]["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,292 @@
+"""Prometheus text-format metrics without a client library.
+
+Metrics live in process memory. With a metrics directory configured (one per server, shared by
+its workers), every process also writes a snapshot to <dir>/<pid>.json from a background thread
+every FLUSH_INTERVAL seconds, and exposition() merges all snapshots: counters and histograms are
+summed over every process that ever wrote one (so requests served by a worker that has since
+exited still count), gauges over live processes only, or reported per pid.
+"""
+import glob
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+FLUSH_INTERVAL = 1.0
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+BYTE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, registry, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}  # label values tuple -> value
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def samples(self):
+        with self._lock:
+            return {key: _copy(value) for key, value in self._values.items()}
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def set_total(self, value, labels=()):
+        # For totals kept elsewhere (e.g. cache statistics), copied in by a collector
+        with self._lock:
+            self._values[labels] = value
+
+
+class Gauge(_Metric):
+    """mode "sum" adds the value up across live processes; "pid" reports each process separately."""
+
+    kind = "gauge"
+
+    def __init__(self, registry, name, help_text, labels=(), mode="sum"):
+        super().__init__(registry, name, help_text, labels)
+        self.mode = mode
+
+    def set(self, value, labels=()):
+        with self._lock:
+            self._values[labels] = value
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, labels=(), amount=1):
+        self.inc(labels, -amount)
+
+    @contextmanager
+    def track(self, labels=()):
+        """Count the block as in progress while it runs."""
+        self.inc(labels)
+        try:
+            yield
+        finally:
+            self.dec(labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, registry, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(registry, name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, labels=()):
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [0] * (len(self.buckets) + 2)  # per-bucket counts, sum, count
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+
+def _copy(value):
+    return list(value) if isinstance(value, list) else value
+
+
+class Registry:
+    def __init__(self, directory=""):
+        self.directory = directory
+        self._metrics = {}
+        self._collectors = []
+        self._derived = []
+        self._flusher_pid = None
+        self._flush_lock = threading.RLock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+
+    def counter(self, name, help_text, labels=()):
+        return Counter(self, name, help_text, labels)
+
+    def gauge(self, name, help_text, labels=(), mode="sum"):
+        return Gauge(self, name, help_text, labels, mode)
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        return Histogram(self, name, help_text, labels, buckets)
+
+    def derived_gauge(self, name, help_text, labels, compute):
+        """A gauge computed at exposition time from the merged samples of other metrics.
+
+        compute(merged) gets {metric name: {label values: value}} and returns {label values: value}.
+        """
+        self._derived.append((name, help_text, tuple(labels), compute))
+
+    def add_collector(self, func):
+        """func() runs before every snapshot to copy in values that are tracked elsewhere."""
+        self._collectors.append(func)
+
+    def snapshot(self):
+        for collect in self._collectors:
+            collect()
+        return {
+            name: [[list(labels), value] for labels, value in metric.samples().items()]
+            for name, metric in self._metrics.items()
+        }
+
+    # --- Multi-process ---
+    def ensure_flusher(self):
+        """Start this process's snapshot writer (once per process; forked workers start their own)."""
+        if not self.directory or self._flusher_pid == os.getpid():
+            return
+        with self._flush_lock:
+            if self._flusher_pid != os.getpid():
+                self._flusher_pid = os.getpid()
+                threading.Thread(target=self._flush_loop, name="qrgen-metrics", daemon=True).start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except OSError:
+                pass
+
+    def flush(self):
+        if not self.directory:
+            return
+        with self._flush_lock:
+            path = os.path.join(self.directory, f"{os.getpid()}.json")
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"pid": os.getpid(), "metrics": self.snapshot()}, f)
+            os.replace(tmp_path, path)
+
+    def _snapshots(self):
+        if not self.directory:
+            return [(os.getpid(), True, self.snapshot())]
+        self.flush()
+        snapshots = []
+        for path in glob.glob(os.path.join(self.directory, "*.json")):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue  # being replaced right now, or left half-written by a killed process
+            pid = data.get("pid", 0)
+            snapshots.append((pid, _alive(pid), data.get("metrics", {})))
+        return snapshots
+
+    # --- Exposition ---
+    def exposition(self) -> str:
+        merged = {name: {} for name in self._metrics}
+        for pid, alive, metrics in self._snapshots():
+            for name, samples in metrics.items():
+                metric = self._metrics.get(name)
+                if metric is None:
+                    continue
+                if metric.kind == "gauge" and not alive:
+                    continue
+                for labels, value in samples:
+                    key = tuple(labels)
+                    if metric.kind == "gauge" and metric.mode == "pid":
+                        key += (str(pid),)
+                    if metric.kind == "histogram":
+                        total = merged[name].setdefault(key, [0] * len(value))
+                        for i, v in enumerate(value):
+                            total[i] += v
+                    else:
+                        merged[name][key] = merged[name].get(key, 0) + value
+
+        lines = []
+        for name, metric in self._metrics.items():
+            lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            per_pid = metric.kind == "gauge" and metric.mode == "pid"
+            label_names = metric.labels + (("pid",) if per_pid else ())
+            bucket_names = label_names + ("le",)
+            for key, value in sorted(merged[name].items()):
+                if metric.kind == "histogram":
+                    cumulative = 0
+                    for bound, count in zip(metric.buckets, value):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_labels(bucket_names, key + (_number(bound),))} {cumulative}")
+                    lines.append(f"{name}_bucket{_labels(bucket_names, key + ('+Inf',))} {value[-1]}")
+                    lines.append(f"{name}_sum{_labels(label_names, key)} {_number(value[-2])}")
+                    lines.append(f"{name}_count{_labels(label_names, key)} {value[-1]}")
+                else:
+                    lines.append(f"{name}{_labels(label_names, key)} {_number(value)}")
+        for name, help_text, label_names, compute in self._derived:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for key, value in sorted(compute(merged).items()):
+                lines.append(f"{name}{_labels(label_names, key)} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _alive(pid):
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(str(v))}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value):
+    if isinstance(value, float):
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        return repr(value)
+    return str(value)
+
+
+def clear_directory(directory):
+    """Remove the snapshots of a previous server run (call once, before starting workers)."""
+    for path in glob.glob(os.path.join(directory, "*.json*")):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def process_rss_bytes():
+    """Resident set size of this process, from /proc where available, else peak RSS from getrusage."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return 0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
@@ -0,0 +1,115 @@
+"""Compact landing-page payloads: every card field in one versioned, compressed base64url value.
+
+Layout of the decoded value (version 1): a header byte (low 7 bits: VERSION, high bit: the body is
+raw deflate), then the body - one byte with a bit per entry of FIELDS that is present, followed by
+each present field in FIELDS order as [prefix index for PREFIXED fields] + LEB128 byte length +
+UTF-8 text. Links and image URLs are stored as an index into PREFIXES plus the rest of the URL, so
+"https://www.instagram.com/someone" costs 1 byte plus the handle.
+
+The landing pages (my_detailc.html, qrdetail.html) carry the matching decoder. PREFIXES is
+append-only: printed codes must keep decoding, so never reorder or remove an entry.
+"""
+import base64
+import binascii
+import zlib
+
+VERSION = 1
+DEFLATED = 0x80
+
+FIELDS = ("name", "msg", "img", "copy", "key", "l1", "l2", "l3")
+PREFIXED = frozenset(("img", "l1", "l2", "l3"))
+
+# Index 0 is "no prefix". The platform entries match PLATFORM_BASES in static/qr_gen.js.
+PREFIXES = (
+    "",
+    "https://www.facebook.com/",
+    "https://www.instagram.com/",
+    "https://www.youtube.com/@",
+    "https://www.linkedin.com/in/",
+    "https://wa.me/",
+    "https://drive.google.com/open?id=",
+    "https://docs.google.com/forms/d/",
+    "tel:",
+    "sms:",
+    "mailto:",
+    "https://github.com/",
+    "https://x.com/",
+    "https://t.me/",
+    "https://youtu.be/",
+    "https://www.",
+    "https://",
+    "http://www.",
+    "http://",
+)
+_LONGEST_FIRST = sorted(range(1, len(PREFIXES)), key=lambda i: -len(PREFIXES[i]))
+
+
+def _split_prefix(value):
+    for index in _LONGEST_FIRST:
+        if value.startswith(PREFIXES[index]):
+            return index, value[len(PREFIXES[index]):]
+    return 0, value
+
+
+def _write_varint(out, n):
+    while n >= 0x80:
+        out.append(n & 0x7F | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def encode(params: dict) -> str:
+    """Pack the FIELDS of params (missing or empty ones are skipped) into a base64url string."""
+    body = bytearray(1)
+    for bit, field in enumerate(FIELDS):
+        value = params.get(field) or ""
+        if not value:
+            continue
+        body[0] |= 1 << bit
+        if field in PREFIXED:
+            index, value = _split_prefix(value)
+            body.append(index)
+        raw = value.encode("utf-8")
+        _write_varint(body, len(raw))
+        body += raw
+
+    compressor = zlib.compressobj(9, zlib.DEFLATED, -15)
+    deflated = compressor.compress(body) + compressor.flush()
+    if len(deflated) < len(body):
+        packed = bytes((VERSION | DEFLATED,)) + deflated
+    else:
+        packed = bytes((VERSION,)) + body
+    return base64.urlsafe_b64encode(packed).rstrip(b"=").decode("ascii")
+
+
+def decode(value: str) -> dict:
+    """Inverse of encode(); raises ValueError on malformed or unknown-version payloads."""
+    try:
+        packed = base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+        if not packed or packed[0] & ~DEFLATED != VERSION:
+            raise ValueError("unsupported payload version")
+        body = zlib.decompress(packed[1:], -15) if packed[0] & DEFLATED else packed[1:]
+        params = {}
+        pos = 1
+        for bit, field in enumerate(FIELDS):
+            if not body[0] & (1 << bit):
+                continue
+            prefix = ""
+            if field in PREFIXED:
+                prefix = PREFIXES[body[pos]]
+                pos += 1
+            length = shift = 0
+            while True:
+                byte = body[pos]
+                pos += 1
+                length |= (byte & 0x7F) << shift
+                shift += 7
+                if not byte & 0x80:
+                    break
+            if pos + length > len(body):
+                raise IndexError("field runs past the end of the payload")
+            params[field] = prefix + body[pos:pos + length].decode("utf-8")
+            pos += length
+    except (IndexError, UnicodeDecodeError, zlib.error, binascii.Error) as e:
+        raise ValueError(f"malformed payload: {e}") from e
+    return params
@@ -0,0 +1,228 @@
+import os
+import threading
+from collections import OrderedDict, namedtuple
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+# --- Card Layout ---
+PADDING = 30
+TEXT_HEIGHT = 40
+CARD_FALLBACK_COLOR = (0xF3, 0xF4, 0xF6)
+BORDER_COLOR = (0xFF, 0xFF, 0xFF)
+TEXT_COLOR = (0x1E, 0x3A, 0x8A)
+DEFAULT_LABEL = "Scan Me!"
+
+
+# --- Card Geometry ---
+def card_size(qr_width, qr_height):
+    return qr_width + 2 * PADDING, qr_height + 2 * PADDING + TEXT_HEIGHT
+
+
+# --- Card Buffer ---
+def _fill(region: np.ndarray, color):
+    # Per-channel scalar fills are much cheaper than broadcasting an RGB tuple over the last axis
+    for channel, value in enumerate(color):
+        region[:, :, channel] = value
+
+
+def new_card(qr_width, qr_height, background=None) -> np.ndarray:
+    """Allocate the H x W x 3 card buffer, filled with the background (or the flat fallback colour)."""
+    card_w, card_h = card_size(qr_width, qr_height)
+    card = np.empty((card_h, card_w, 3), dtype=np.uint8)
+    if background is not None and background.shape[:2] == (card_h, card_w):
+        card[...] = background
+    else:
+        _fill(card, CARD_FALLBACK_COLOR)
+    # White frame around the QR: 1px outside the top/left edge, 2px outside the bottom/right edge
+    _fill(card[PADDING - 1:PADDING + qr_height + 2, PADDING - 1:PADDING + qr_width + 2], BORDER_COLOR)
+    return card
+
+
+def paste_modules(card: np.ndarray, modules: np.ndarray, box_size, border):
+    """Scale the module matrix by box_size and write it into the card at (PADDING, PADDING)."""
+    if border:
+        modules = np.pad(modules, border, constant_values=False)
+    # Scale a single 8-bit plane, then copy it into each channel (no boolean-mask scatter over RGB)
+    pixels = np.where(modules, np.uint8(0), np.uint8(255)).repeat(box_size, axis=0).repeat(box_size, axis=1)
+    h, w = pixels.shape
+    region = card[PADDING:PADDING + h, PADDING:PADDING + w]
+    for channel in range(3):
+        region[:, :, channel] = pixels
+
+
+def qr_image(modules: np.ndarray, box_size, border) -> Image.Image:
+    """The bare QR symbol (with quiet zone) as an 8-bit greyscale image."""
+    if border:
+        modules = np.pad(modules, border, constant_values=False)
+    pixels = np.where(modules, np.uint8(0), np.uint8(255)).repeat(box_size, axis=0).repeat(box_size, axis=1)
+    h, w = pixels.shape
+    return Image.frombuffer("L", (w, h), pixels, "raw", "L", 0, 1)
+
+
+def paste_image(card: np.ndarray, qr_img: Image.Image):
+    w, h = qr_img.size
+    card[PADDING:PADDING + h, PADDING:PADDING + w] = np.asarray(qr_img.convert("RGB"))
+
+
+# --- Background Cache ---
+class BackgroundCache:
+    """Bounded LRU of decoded, card-sized backgrounds keyed by (path, mtime, size, card dimensions, filter)."""
+
+    def __init__(self, max_entries=8, resample=Image.Resampling.BICUBIC):
+        self.max_entries = max_entries
+        self.resample = resample
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def fingerprint(*paths):
+        """Stat the candidate paths in order; returns (path, mtime_ns, size) of the first that exists, else None."""
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            return path, st.st_mtime_ns, st.st_size
+        return None
+
+    def get(self, fingerprint, width, height, resample=None) -> np.ndarray:
+        resample = self.resample if resample is None else resample
+        key = (*fingerprint, width, height, resample)
+        with self._lock:
+            background = self._entries.get(key)
+            if background is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return background
+            self.misses += 1
+
+        background = self._decode(fingerprint[0], width, height, resample)
+        with self._lock:
+            self._entries[key] = background
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return background
+
+    @staticmethod
+    def _decode(path, width, height, resample) -> np.ndarray:
+        with Image.open(path) as img:
+            img = img.convert("RGB")
+        # Integer box-reduce first so the resampling filter only sees roughly card-sized input
+        factor = min(img.width // width, img.height // height)
+        if factor >= 2:
+            img = img.reduce(factor)
+        if img.size != (width, height):
+            img = img.resize((width, height), resample)
+        background = np.asarray(img)
+        background.setflags(write=False)
+        return background
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def count_lookups(self, hits, misses):
+        """Add lookups made by another process's copy of this cache (a render farm worker) to the stats."""
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+
+# --- Label ---
+PRESET_LABELS = ("Scan Me!", "Visit My Profile", "Contact Me")
+LABEL_CACHE_SIZE = 256
+
+LabelBitmap = namedtuple("LabelBitmap", "inv_alpha premultiplied bbox")
+
+
+@lru_cache(maxsize=None)
+def load_font(font_path, size=16):
+    """Load a font once per (path, size), falling back to arial.ttf and then PIL's default font."""
+    try:
+        return ImageFont.truetype(font_path, size)
+    except Exception:
+        try:
+            return ImageFont.truetype("arial.ttf", size)
+        except Exception:
+            return ImageFont.load_default()
+
+
+@lru_cache(maxsize=LABEL_CACHE_SIZE)
+def label_bitmap(text, font_path, size=16, color=TEXT_COLOR) -> LabelBitmap:
+    """Rasterize and measure a label once; the colour is pre-multiplied so drawing it is a single blend."""
+    font = load_font(font_path, size)
+    left, top, right, bottom = ImageDraw.Draw(Image.new("L", (1, 1))).textbbox((0, 0), text, font=font)
+    mask = Image.new("L", (max(right - left, 1), max(bottom - top, 1)))
+    ImageDraw.Draw(mask).text((-left, -top), text, fill=255, font=font)
+    alpha = np.asarray(mask, dtype=np.uint16)[:, :, None]
+    inv_alpha = 255 - alpha
+    premultiplied = alpha * np.array(color, dtype=np.uint16) + 127
+    inv_alpha.setflags(write=False)
+    premultiplied.setflags(write=False)
+    return LabelBitmap(inv_alpha, premultiplied, (left, top, right, bottom))
+
+
+def warm_labels(font_path, size=16, labels=PRESET_LABELS):
+    for text in labels:
+        label_bitmap(text, font_path, size)
+
+
+def blit_label(card: np.ndarray, label: LabelBitmap, x, y):
+    """Blend a cached label into card with its top-left at (x, y), clipped to the card."""
+    card_h, card_w = card.shape[:2]
+    label_h, label_w = label.inv_alpha.shape[:2]
+    x0, y0 = max(x, 0), max(y, 0)
+    x1, y1 = min(x + label_w, card_w), min(y + label_h, card_h)
+    if x0 >= x1 or y0 >= y1:
+        return
+    rows, cols = slice(y0 - y, y1 - y), slice(x0 - x, x1 - x)
+    region = card[y0:y1, x0:x1]
+    region[...] = (region * label.inv_alpha[rows, cols] + label.premultiplied[rows, cols]) // 255
+
+
+def draw_label(card: np.ndarray, qr_height, text, font_path, size=16, color=TEXT_COLOR):
+    card_w = card.shape[1]
+    label = label_bitmap(text, font_path, size, color)
+    left, top, right, bottom = label.bbox
+    text_x = int((card_w - (right - left)) / 2)
+    text_y = int(qr_height + PADDING + (TEXT_HEIGHT - (bottom - top)) / 2 + 5)
+    blit_label(card, label, text_x + left, text_y + top)
+
+
+# --- Final Image ---
+def to_image(card: np.ndarray) -> Image.Image:
+    card_h, card_w = card.shape[:2]
+    return Image.frombuffer("RGB", (card_w, card_h), card, "raw", "RGB", 0, 1)
+
+
+def to_palette(img: Image.Image):
+    """Losslessly re-express img as 1-bit or 8-bit palette when it has few enough colours, else None."""
+    if img.mode in ("1", "P"):
+        return img
+    colors = img.getcolors(256)
+    if colors is None:
+        return None
+    values = {color for _, color in colors}
+    if img.mode == "L":
+        values = {(v, v, v) for v in values}
+    elif img.mode != "RGB":
+        return None
+    if values <= {(0, 0, 0), (255, 255, 255)}:
+        return img.convert("L").convert("1", dither=Image.Dither.NONE)
+
+    pixels = np.asarray(img.convert("RGB")).astype(np.uint32)
+    packed = (pixels[:, :, 0] << 16) | (pixels[:, :, 1] << 8) | pixels[:, :, 2]
+    palette = np.array(sorted((r << 16) | (g << 8) | b for r, g, b in values), dtype=np.uint32)
+    indices = np.searchsorted(palette, packed).astype(np.uint8)
+    paletted = Image.frombuffer("P", img.size, np.ascontiguousarray(indices), "raw", "P", 0, 1)
+    paletted.putpalette(np.stack([palette >> 16, (palette >> 8) & 0xFF, palette & 0xFF], axis=1).astype(np.uint8).tobytes())
+    return paletted
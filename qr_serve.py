@@ -0,0 +1,311 @@
+"""Production entry point: a prefork server with a bounded thread pool per worker.
+
+The master process binds the socket and forks --workers processes. Each worker imports the app
+itself, warms it up (fonts, background, one render) and only then starts accepting connections.
+After its last request a worker runs the app module's shut_down() hook, if it has one.
+
+    python qr_serve.py --bind 0.0.0.0:8000 --workers 4 --threads 8
+
+Signals to the master: SIGHUP does a graceful reload. A fresh generation of workers is started
+(re-importing the code) and warmed up, then the old workers finish their in-flight requests and
+exit. SIGTERM/SIGINT stop all workers gracefully. A worker that is not ready within WARMUP_TIMEOUT
+is killed and replaced.
+"""
+import argparse
+import importlib
+import os
+import select
+import signal
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+import qr_metrics
+
+DEFAULT_BIND = "127.0.0.1:5000"
+DEFAULT_THREADS = 8
+KEEPALIVE_TIMEOUT = 5  # seconds an idle keep-alive connection may hold a pool thread
+WARMUP_TIMEOUT = 60
+DEFAULT_SESSION_DB = "qrgen_sessions.db"
+DEFAULT_METRICS_DIR = "qrgen_metrics"
+
+
+class _RequestHandler(WSGIRequestHandler):
+    protocol_version = "HTTP/1.1"
+    timeout = KEEPALIVE_TIMEOUT
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """werkzeug WSGI server that handles connections on a fixed-size thread pool.
+
+    When every thread is busy the accept loop blocks, so excess load queues in the kernel backlog
+    instead of spawning unbounded threads.
+    """
+
+    multithread = True
+    request_queue_size = 1024
+
+    def __init__(self, host, port, app, threads=DEFAULT_THREADS, fd=None):
+        self._pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="qrgen-http")
+        self._slots = threading.BoundedSemaphore(threads)
+        super().__init__(host, port, app, handler=_RequestHandler, fd=fd)
+
+    def process_request(self, request, client_address):
+        self._slots.acquire()
+        self._pool.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._slots.release()
+
+    def serve_forever(self, poll_interval=0.5):
+        try:
+            super().serve_forever(poll_interval)
+        finally:
+            # The listening socket is closed by now; let in-flight requests finish
+            self._pool.shutdown(wait=True)
+
+
+def make_server(app, host, port, threads=DEFAULT_THREADS, fd=None) -> PooledWSGIServer:
+    return PooledWSGIServer(host, port, app, threads=threads, fd=fd)
+
+
+def load_app(app_module):
+    """Import the app module, run its warm_up() hook if it has one, and return the WSGI app."""
+    module = importlib.import_module(app_module)
+    warm_up = getattr(module, "warm_up", None)
+    if warm_up is not None:
+        warm_up()
+    return module.app
+
+
+# --- Worker ---
+def _worker_main(sock, app_module, threads, ready_fd):
+    server = None
+    stopping = threading.Event()
+
+    def stop(signum, frame):
+        stopping.set()
+        if server is not None:
+            # shutdown() waits for serve_forever(), which runs on this (the signal-receiving) thread
+            threading.Thread(target=server.shutdown, daemon=True).start()
+        else:
+            sys.exit(0)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl-C reaches the whole group; the master coordinates
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+
+    app = load_app(app_module)
+    host, port = sock.getsockname()[:2]
+    server = make_server(app, host, port, threads=threads, fd=sock.fileno())
+    server.multiprocess = True
+    os.write(ready_fd, b"1")
+    os.close(ready_fd)
+    if not stopping.is_set():
+        server.serve_forever()
+    shut_down = getattr(sys.modules[app_module], "shut_down", None)
+    if shut_down is not None:
+        shut_down()
+
+
+# --- Master ---
+class Arbiter:
+    def __init__(self, sock, app_module, workers, threads):
+        self.sock = sock
+        self.app_module = app_module
+        self.num_workers = workers
+        self.threads = threads
+        self.workers = {}  # pid -> generation
+        self.starting = {}  # pid -> (ready pipe, warm-up deadline) for workers not yet accepting
+        self.retiring = []  # the previous generation, stopped once the current one is ready
+        self.generation = 0
+        self._reload = False
+        self._stopping = False
+
+    def run(self):
+        signal.signal(signal.SIGHUP, self._on_hup)
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        self._start_generation()
+        print(f"[qr_serve] master {os.getpid()} serving on {self._address()} "
+              f"with {self.num_workers} workers x {self.threads} threads", flush=True)
+        while not self._stopping:
+            if self._reload:
+                self._reload = False
+                self._reload_workers()
+            self._reap()
+            missing = self.num_workers - sum(1 for gen in self.workers.values() if gen == self.generation)
+            for _ in range(missing):
+                self._spawn()
+            self._check_ready(timeout=0.2)
+            ready = sum(1 for pid, gen in self.workers.items() if gen == self.generation and pid not in self.starting)
+            if self.retiring and ready >= self.num_workers:
+                # New workers are warm before the old generation stops accepting connections
+                self._terminate(self.retiring)
+                self.retiring = []
+        self._terminate(list(self.workers))
+        self._wait_for(list(self.workers))
+
+    def _address(self):
+        host, port = self.sock.getsockname()[:2]
+        return f"http://{host}:{port}"
+
+    def _on_hup(self, signum, frame):
+        self._reload = True
+
+    def _on_stop(self, signum, frame):
+        self._stopping = True
+
+    def _spawn(self):
+        ready_r, ready_w = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(ready_r)
+            for other_r, _ in self.starting.values():
+                os.close(other_r)
+            code = 0
+            try:
+                _worker_main(self.sock, self.app_module, self.threads, ready_w)
+            except SystemExit as e:
+                code = e.code if isinstance(e.code, int) else 0
+            except BaseException:
+                import traceback
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+        os.close(ready_w)
+        self.workers[pid] = self.generation
+        self.starting[pid] = (ready_r, time.monotonic() + WARMUP_TIMEOUT)
+        return pid
+
+    def _check_ready(self, timeout):
+        # Waits at most `timeout` for warm-up reports, so signals keep being handled while workers start
+        pipes = {ready_r: pid for pid, (ready_r, _) in self.starting.items()}
+        if pipes:
+            readable, _, _ = select.select(list(pipes), [], [], timeout)
+        else:
+            readable = []
+            time.sleep(timeout)
+        for ready_r in readable:
+            pid = pipes[ready_r]
+            if not os.read(ready_r, 1):
+                # The worker exited during warm-up; _reap() collects it and the loop respawns it
+                print(f"[qr_serve] worker {pid} failed to warm up", file=sys.stderr, flush=True)
+            self._started(pid)
+        now = time.monotonic()
+        for pid, (_, deadline) in list(self.starting.items()):
+            if now >= deadline:
+                print(f"[qr_serve] worker {pid} did not warm up in {WARMUP_TIMEOUT}s; killing it",
+                      file=sys.stderr, flush=True)
+                self._started(pid)
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                    os.waitpid(pid, 0)
+                except (ProcessLookupError, ChildProcessError):
+                    pass
+                self.workers.pop(pid, None)  # the loop spawns a replacement
+
+    def _started(self, pid):
+        entry = self.starting.pop(pid, None)
+        if entry is not None:
+            os.close(entry[0])
+
+    def _start_generation(self):
+        self.generation += 1
+        for _ in range(self.num_workers):
+            self._spawn()
+
+    def _reload_workers(self):
+        old = list(self.workers)
+        print(f"[qr_serve] reloading: replacing {len(old)} workers", flush=True)
+        # run() stops the old generation once the new one has warmed up
+        self.retiring.extend(old)
+        self._start_generation()
+
+    def _terminate(self, pids):
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                self.workers.pop(pid, None)
+
+    def _reap(self):
+        while self.workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            generation = self.workers.pop(pid, None)
+            self._started(pid)
+            if generation == self.generation and not self._stopping and os.waitstatus_to_exitcode(status) != 0:
+                print(f"[qr_serve] worker {pid} exited unexpectedly; respawning", file=sys.stderr, flush=True)
+
+    def _wait_for(self, pids, timeout=30):
+        deadline = time.monotonic() + timeout
+        while self.workers and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.1)
+        for pid in list(self.workers):
+            os.kill(pid, signal.SIGKILL)
+        self._reap()
+
+
+def parse_bind(bind):
+    host, _, port = bind.rpartition(":")
+    return (host or "127.0.0.1").strip("[]"), int(port)
+
+
+def serve(bind=DEFAULT_BIND, workers=None, threads=DEFAULT_THREADS, app_module="QR_GEN"):
+    workers = workers or os.cpu_count() or 1
+    host, port = parse_bind(bind)
+    if not hasattr(os, "fork"):
+        # No prefork on this platform: a single pooled process
+        server = make_server(load_app(app_module), host, port, threads=threads)
+        print(f"[qr_serve] serving on http://{host}:{port} with {threads} threads", flush=True)
+        server.serve_forever()
+        return
+
+    if workers > 1:
+        # Generation state must be visible to every worker process
+        os.environ.setdefault("QRGEN_SESSION_DB", DEFAULT_SESSION_DB)
+        # ...and so must /metrics: workers write snapshots here and every worker serves the sum
+        os.environ.setdefault("QRGEN_METRICS_DIR", DEFAULT_METRICS_DIR)
+        qr_metrics.clear_directory(os.environ["QRGEN_METRICS_DIR"])
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.create_server((host, port), family=family, backlog=PooledWSGIServer.request_queue_size)
+    sock.set_inheritable(True)
+    # Every worker accepts on this socket. Non-blocking, so a worker that loses the race for a connection
+    # gets BlockingIOError, which socketserver treats as no request, and goes back to its select loop
+    # (where it sees shutdown()) instead of blocking in accept()
+    sock.setblocking(False)
+    try:
+        Arbiter(sock, app_module, workers, threads).run()
+    finally:
+        sock.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the QR generator with prefork workers.")
+    parser.add_argument("--bind", default=DEFAULT_BIND, help=f"host:port to listen on (default: {DEFAULT_BIND})")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count(), help="worker processes (default: all cores)")
+    parser.add_argument("-t", "--threads", type=int, default=DEFAULT_THREADS, help=f"threads per worker (default: {DEFAULT_THREADS})")
+    parser.add_argument("--app", default="QR_GEN", help="module that defines the Flask `app` (default: QR_GEN)")
+    args = parser.parse_args(argv)
+    serve(args.bind, args.workers, args.threads, args.app)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import base64
+import io
+from xml.sax.saxutils import escape
+
+import numpy as np
+from PIL import Image
+
+import qr_render
+
+
+# --- Path Merging ---
+def module_rects(modules: np.ndarray):
+    """Cover the dark modules with rectangles: horizontal runs, merged downwards while identical.
+
+    Yields (x, y, width, height) in module units.
+    """
+    open_rects = {}  # (x, width) -> top row of a rectangle still growing downwards
+    rows = modules.shape[0]
+    for y in range(rows + 1):
+        runs = set()
+        if y < rows:
+            padded = np.concatenate(([False], modules[y], [False])).astype(np.int8)
+            edges = np.flatnonzero(np.diff(padded))
+            runs = {(int(start), int(end - start)) for start, end in zip(edges[::2], edges[1::2])}
+        for run in list(open_rects):
+            if run not in runs:
+                top = open_rects.pop(run)
+                yield run[0], top, run[1], y - top
+        for run in runs:
+            open_rects.setdefault(run, y)
+
+
+def modules_path(modules: np.ndarray, offset=0) -> str:
+    return "".join(
+        f"M{x + offset} {y + offset}h{w}v{h}h-{w}z"
+        for x, y, w, h in sorted(module_rects(modules), key=lambda r: (r[1], r[0]))
+    )
+
+
+# --- Documents ---
+def qr_svg(modules: np.ndarray, box_size, border) -> str:
+    """The bare QR symbol (with quiet zone); drawn in module units and scaled by the viewBox."""
+    size = modules.shape[0] + 2 * border
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {size} {size}" '
+        f'width="{size * box_size}" height="{size * box_size}" shape-rendering="crispEdges">'
+        f'<rect width="{size}" height="{size}" fill="#fff"/>'
+        f'<path d="{modules_path(modules, border)}" fill="#000"/>'
+        "</svg>"
+    )
+
+
+def card_svg(modules: np.ndarray, box_size, border, text, background=None) -> str:
+    """The full card: background (embedded JPEG or flat colour), white frame, QR and label."""
+    qr_size = (modules.shape[0] + 2 * border) * box_size
+    card_w, card_h = qr_render.card_size(qr_size, qr_size)
+    pad = qr_render.PADDING
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" '
+        f'viewBox="0 0 {card_w} {card_h}" width="{card_w}" height="{card_h}">'
+    ]
+    if background is not None:
+        parts.append(f'<image width="{card_w}" height="{card_h}" xlink:href="{background_data_uri(background)}"/>')
+    else:
+        parts.append(f'<rect width="{card_w}" height="{card_h}" fill="{_hex(qr_render.CARD_FALLBACK_COLOR)}"/>')
+    parts.append(
+        f'<rect x="{pad - 1}" y="{pad - 1}" width="{qr_size + 3}" height="{qr_size + 3}" '
+        f'fill="{_hex(qr_render.BORDER_COLOR)}"/>'
+    )
+    size = modules.shape[0] + 2 * border
+    parts.append(
+        f'<g transform="translate({pad} {pad}) scale({box_size})" shape-rendering="crispEdges">'
+        f'<rect width="{size}" height="{size}" fill="#fff"/>'
+        f'<path d="{modules_path(modules, border)}" fill="#000"/></g>'
+    )
+    parts.append(
+        f'<text x="{card_w / 2:g}" y="{qr_size + pad + qr_render.TEXT_HEIGHT / 2 + 5:g}" '
+        f'text-anchor="middle" dominant-baseline="middle" font-family="Poppins, Arial, sans-serif" '
+        f'font-weight="700" font-size="16" fill="{_hex(qr_render.TEXT_COLOR)}">{escape(text)}</text>'
+    )
+    parts.append("</svg>")
+    return "".join(parts)
+
+
+def background_data_uri(background: np.ndarray, quality=85) -> str:
+    buf = io.BytesIO()
+    Image.fromarray(background).save(buf, format="JPEG", quality=quality)
+    return "data:image/jpeg;base64," + base64.b64encode(buf.getvalue()).decode()
+
+
+def _hex(color):
+    return "#%02x%02x%02x" % color
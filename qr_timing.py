@@ -0,0 +1,89 @@
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_current = ContextVar("qr_timing", default=None)
+
+
+class Timing:
+    """Stage durations for one request; becomes the current collector until finish() is called."""
+
+    def __init__(self):
+        self.stages = {}  # name -> seconds, summed when a stage runs more than once
+        self.marks = {}  # name -> short description (e.g. cache hit/miss)
+        self.started = time.perf_counter()
+        self._token = _current.set(self)
+
+    def finish(self) -> float:
+        """Stop collecting; returns the total elapsed seconds."""
+        try:
+            _current.reset(self._token)
+        except ValueError:
+            _current.set(None)  # finished from a different context than it was started in
+        return self.elapsed()
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+
+def start() -> Timing:
+    return Timing()
+
+
+@contextmanager
+def stage(name):
+    """Time a block as stage `name` of the current request; a no-op outside a timed request."""
+    timing = _current.get()
+    if timing is None:
+        yield
+        return
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.stages[name] = timing.stages.get(name, 0.0) + time.perf_counter() - start_time
+
+
+def mark(name, description):
+    timing = _current.get()
+    if timing is not None:
+        timing.marks[name] = description
+
+
+def merge(stages, marks=None):
+    """Add stages (and marks) timed elsewhere, e.g. in a render farm worker, to the current request."""
+    timing = _current.get()
+    if timing is None:
+        return
+    for name, seconds in stages.items():
+        timing.stages[name] = timing.stages.get(name, 0.0) + seconds
+    timing.marks.update(marks or {})
+
+
+def server_timing_header(timing: Timing, total) -> str:
+    """Server-Timing value: one metric per stage (milliseconds), marks as descriptions, then total."""
+    parts = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in timing.stages.items()]
+    parts.extend(f'{name};desc="{description}"' for name, description in timing.marks.items())
+    parts.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(parts)
+
+
+class SlowRequestLog:
+    """Appends one JSON object per slow request to a file (or stderr when no path is given)."""
+
+    def __init__(self, path=""):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def write(self, record: dict):
+        line = json.dumps(record, default=str, ensure_ascii=False) + "\n"
+        with self._lock:
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line)
+            else:
+                sys.stderr.write(line)
+                sys.stderr.flush()
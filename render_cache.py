@@ -0,0 +1,65 @@
+import hashlib
+import threading
+from collections import OrderedDict, namedtuple
+
+RenderedCard = namedtuple("RenderedCard", "key png version", defaults=(None,))
+
+
+def make_key(encoded_url, box_size, error_level, custom_text, background=None) -> str:
+    """Content address of a card: sha256 over every input that changes its pixels."""
+    h = hashlib.sha256()
+    for part in (encoded_url, box_size, error_level, custom_text, background):
+        h.update(repr(part).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class RenderCache:
+    """Size-bounded LRU of finished cards (PNG bytes), keyed by make_key()."""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            card = self._entries.get(key)
+            if card is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return card
+
+    def put(self, key, png: bytes, version=None) -> RenderedCard:
+        card = RenderedCard(key, png, version)
+        size = _entry_size(card)
+        if size > self.max_bytes:
+            return card
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= _entry_size(old)
+            self._entries[key] = card
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= _entry_size(evicted)
+        return card
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries), "bytes": self._bytes}
+
+
+def _entry_size(card: RenderedCard):
+    return len(card.png)
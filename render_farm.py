@@ -0,0 +1,328 @@
+"""Render farm: a persistent pool of pre-warmed worker processes.
+
+submit(func, *args) runs a module-level function in a worker, like multiprocessing.Pool, and returns a
+concurrent.futures.Future. What differs from a plain Pool:
+
+- Workers are spawned once (spawn, so a multi-threaded parent such as a web worker is safe to start
+  them from), run `initializer` (e.g. QR_GEN.warm_up_renderer) before taking jobs, and are replaced after
+  max_jobs jobs or when they die. A job whose worker died is retried once on another worker.
+- A bytes result, or the bytes item of a tuple result, does not travel through the pipe: every worker
+  owns a shared-memory segment, writes the bytes there and sends only the segment name and size. The
+  parent copies them out before the worker gets its next job, so one segment per worker is enough; a
+  result that does not fit makes the worker replace it with a larger one.
+- At most max_pending jobs are queued or running; submit() blocks until there is room, or raises
+  FarmBusy once `timeout` seconds have passed.
+- A worker that dies before it is ready (e.g. its initializer raises) is replaced after a backoff
+  that doubles with each consecutive failure. Queued jobs wait for the healthy workers; they fail
+  only after MAX_START_FAILURES failures in a row with no worker ready to run them.
+"""
+import collections
+import itertools
+import os
+import pickle
+import signal
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import connection, get_context, shared_memory
+
+DEFAULT_MAX_JOBS = 1000
+MIN_SEGMENT_BYTES = 1024 * 1024
+MAX_START_FAILURES = 5
+RESPAWN_BACKOFF = (0.1, 10.0)  # seconds before replacing a worker that failed to start: first, longest
+
+
+class FarmBusy(Exception):
+    """The farm's queue stayed full for the whole submit() timeout."""
+
+
+class WorkerDied(RuntimeError):
+    pass
+
+
+# --- Worker ---
+def _worker_main(conn, initializer, max_jobs):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl-C reaches the whole group; the parent stops us
+    if initializer is not None:
+        initializer()
+    conn.send(("ready",))
+    segment = None
+    try:
+        for done in itertools.count(1):
+            job = conn.recv()
+            if job is None:
+                break
+            func, args = job
+            retiring = done >= max_jobs
+            try:
+                result = func(*args)
+                index, data = _find_bytes(result)
+                if data is None:
+                    conn.send(("ok", result, None, None, 0, retiring))
+                else:
+                    if segment is None or segment.size < len(data):
+                        if segment is not None:
+                            segment.close()  # the parent unlinks it when it sees the new name
+                        segment = shared_memory.SharedMemory(create=True, size=max(MIN_SEGMENT_BYTES, 2 * len(data)))
+                    segment.buf[:len(data)] = data
+                    template = None if index is None else result[:index] + (None,) + result[index + 1:]
+                    conn.send(("ok", template, index, segment.name, len(data), retiring))
+            except Exception as e:
+                conn.send(("error", _picklable(e), None, None, 0, retiring))
+            if retiring:
+                break
+    finally:
+        if segment is not None:
+            segment.close()
+
+
+def _find_bytes(result):
+    # (index of the bytes item in a tuple result, or None for a bare bytes result; the bytes)
+    if isinstance(result, (bytes, bytearray)):
+        return None, result
+    if isinstance(result, tuple):
+        for index, item in enumerate(result):
+            if isinstance(item, (bytes, bytearray)):
+                return index, item
+    return None, None
+
+
+def _picklable(error):
+    try:
+        pickle.dumps(error)
+        return error
+    except Exception:
+        return RuntimeError(f"{type(error).__name__}: {error}")
+
+
+# --- Pool ---
+class _Worker:
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+        self.ready = False
+        self.retiring = False
+        self.job = None  # (future, func, args, attempt)
+        self.segment = None
+
+
+class RenderFarm:
+    def __init__(self, workers=None, max_jobs=DEFAULT_MAX_JOBS, max_pending=None, initializer=None):
+        self.size = workers or os.cpu_count() or 1
+        self.max_jobs = max_jobs
+        self.max_pending = max_pending or self.size * 4
+        self.initializer = initializer
+        self.pid = None  # the process that started the workers; a forked child starts its own
+        self._context = get_context("spawn")
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._queue = collections.deque()  # (future, func, args, attempt)
+        self._lock = threading.Lock()
+        self._workers = []
+        self._closing = False
+        self._thread = None
+        self._start_failures = 0  # consecutive workers that died before they were ready
+        self._respawns = []  # monotonic times at which to replace workers that failed to start
+        self._ready = threading.Event()  # set once every worker has run its initializer
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def start(self, timeout=None) -> bool:
+        """Spawn the workers now (submit() otherwise does it on first use) and wait until all are ready."""
+        self._ensure_started()
+        return self._ready.wait(timeout)
+
+    def _ensure_started(self):
+        if self.pid == os.getpid():
+            return
+        with self._lock:
+            if self.pid == os.getpid():
+                return
+            self._wake_r, self._wake_w = self._context.Pipe(duplex=False)
+            self._ready = threading.Event()
+            self._workers = []
+            self._start_failures = 0
+            self._respawns = []
+            for _ in range(self.size):
+                self._spawn()
+            self._thread = threading.Thread(target=self._manage, name="render-farm", daemon=True)
+            self._thread.start()
+            self.pid = os.getpid()
+
+    def _spawn(self):
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main, args=(child_conn, self.initializer, self.max_jobs), daemon=True
+        )
+        process.start()
+        child_conn.close()
+        self._workers.append(_Worker(process, parent_conn))
+
+    # --- Submitting ---
+    def submit(self, func, *args, timeout=None) -> Future:
+        if self._closing:
+            raise RuntimeError("Render farm is closed")
+        self._ensure_started()
+        if not self._slots.acquire(timeout=timeout):
+            raise FarmBusy(f"{self.max_pending} renders already queued")
+        future = Future()
+        future.add_done_callback(lambda _: self._slots.release())
+        with self._lock:
+            self._queue.append((future, func, args, 0))
+            self._wake_w.send_bytes(b"")
+        return future
+
+    def submit_all(self, func, arg_tuples, window=None):
+        """Yield one future per args tuple, in order, keeping up to `window` jobs submitted ahead."""
+        window = window or self.max_pending
+        pending = collections.deque()
+        for args in arg_tuples:
+            pending.append(self.submit(func, *args))
+            if len(pending) >= window:
+                yield pending.popleft()
+        yield from pending
+
+    def imap(self, func, iterable):
+        """Like Pool.imap: func(item) for every item, results in order."""
+        for future in self.submit_all(func, ((item,) for item in iterable)):
+            yield future.result()
+
+    def close(self):
+        """Finish every submitted job, then stop the workers."""
+        self._closing = True
+        if self._thread is not None and self.pid == os.getpid():
+            with self._lock:
+                self._wake_w.send_bytes(b"")
+            self._thread.join()
+
+    # --- Manager thread ---
+    def _manage(self):
+        while True:
+            self._respawn_due()
+            self._dispatch()
+            if self._closing and not self._queue and not any(w.job for w in self._workers):
+                break
+            conns = {w.conn: w for w in self._workers}
+            sentinels = {w.process.sentinel: w for w in self._workers}
+            timeout = max(0.0, min(self._respawns) - time.monotonic()) if self._respawns else None
+            ready = connection.wait([self._wake_r, *conns, *sentinels], timeout)
+            if self._wake_r in ready:
+                while self._wake_r.poll():
+                    self._wake_r.recv_bytes()
+            for conn in ready:
+                if conn in conns:
+                    self._receive(conns[conn])
+            for sentinel in ready:
+                if sentinel in sentinels:
+                    self._reap(sentinels[sentinel])
+        self._shut_down_workers()
+
+    def _dispatch(self):
+        for worker in self._workers:
+            while worker.ready and not worker.retiring and worker.job is None:
+                with self._lock:
+                    if not self._queue:
+                        return
+                    future, func, args, attempt = self._queue.popleft()
+                if attempt == 0 and not future.set_running_or_notify_cancel():
+                    continue  # cancelled while queued
+                try:
+                    worker.conn.send((func, args))
+                except (pickle.PicklingError, TypeError, AttributeError) as e:
+                    future.set_exception(e)
+                    continue
+                except OSError:
+                    pass  # the worker is gone; _reap() retries the job
+                worker.job = (future, func, args, attempt)
+
+    def _receive(self, worker):
+        try:
+            message = worker.conn.recv()
+        except (EOFError, OSError):
+            return  # died; the sentinel reports it
+        if message[0] == "ready":
+            worker.ready = True
+            self._start_failures = 0
+            if all(w.ready for w in self._workers):
+                self._ready.set()
+            return
+        status, payload, index, segment_name, size, retiring = message
+        future = worker.job[0]
+        worker.job = None
+        if retiring:
+            worker.retiring = True
+            self._spawn()  # warm the replacement while the old worker exits
+        if status == "error":
+            future.set_exception(payload)
+            return
+        if segment_name is not None:
+            if worker.segment is None or worker.segment.name != segment_name:
+                self._drop_segment(worker)
+                worker.segment = shared_memory.SharedMemory(name=segment_name)
+            data = bytes(worker.segment.buf[:size])
+            payload = data if index is None else payload[:index] + (data,) + payload[index + 1:]
+        future.set_result(payload)
+
+    def _reap(self, worker):
+        if worker.conn.poll():
+            self._receive(worker)  # its last result may still be in the pipe
+        worker.process.join()
+        self._workers.remove(worker)
+        self._drop_segment(worker)
+        worker.conn.close()
+        if worker.job is not None:
+            future, func, args, attempt = worker.job
+            if attempt == 0:
+                with self._lock:
+                    self._queue.appendleft((future, func, args, 1))
+            else:
+                future.set_exception(WorkerDied(f"Render worker exited with code {worker.process.exitcode}"))
+        if worker.retiring or (self._closing and not self._queue):
+            return
+        if worker.ready:
+            self._spawn()
+            return
+        # Died during start-up (e.g. the initializer failed): replace it after a backoff
+        self._start_failures += 1
+        first, longest = RESPAWN_BACKOFF
+        delay = min(longest, first * 2 ** (self._start_failures - 1))
+        self._respawns.append(time.monotonic() + delay)
+        if self._start_failures >= MAX_START_FAILURES and not any(w.ready for w in self._workers):
+            # Nothing can run the queued jobs: fail them instead of letting them wait
+            with self._lock:
+                queued, self._queue = self._queue, collections.deque()
+            for future, _, _, _ in queued:
+                future.set_exception(WorkerDied(f"Render worker failed to start (exit code {worker.process.exitcode})"))
+
+    def _respawn_due(self):
+        now = time.monotonic()
+        due = [at for at in self._respawns if at <= now]
+        if due:
+            self._respawns = [at for at in self._respawns if at > now]
+            if not self._closing or self._queue:
+                for _ in due:
+                    self._spawn()
+
+    def _drop_segment(self, worker):
+        if worker.segment is not None:
+            worker.segment.close()
+            try:
+                worker.segment.unlink()
+            except FileNotFoundError:
+                pass
+            worker.segment = None
+
+    def _shut_down_workers(self):
+        for worker in self._workers:
+            try:
+                worker.conn.send(None)
+            except OSError:
+                pass
+        for worker in self._workers:
+            worker.process.join()
+            self._drop_segment(worker)
+            worker.conn.close()
+        self._workers = []
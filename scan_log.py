@@ -0,0 +1,129 @@
+"""Write-behind scan counting for short-link redirects.
+
+record() only classifies the user agent (memoized) and appends to an in-memory ring buffer; a
+background thread drains the buffer into SQLite every flush_interval seconds, one transaction per
+flush. If the buffer fills faster than it is drained, the oldest unflushed scans are overwritten and
+counted in `dropped`. Counts are therefore up to flush_interval seconds behind.
+"""
+import atexit
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+
+import sqlite_db
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS scans (code TEXT NOT NULL, scanned_at REAL NOT NULL, agent TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS scans_code_time ON scans (code, scanned_at)",
+)
+
+AGENT_CLASSES = ("ios", "android", "desktop", "bot", "other")
+_AGENT_PATTERNS = (
+    ("bot", re.compile(r"bot|crawl|spider|slurp|preview|facebookexternalhit|curl|wget|python-", re.I)),
+    ("ios", re.compile(r"iPhone|iPad|iPod|CFNetwork")),
+    ("android", re.compile(r"Android")),
+    ("desktop", re.compile(r"Windows NT|Macintosh|X11|CrOS")),
+)
+
+
+@lru_cache(maxsize=2048)
+def classify_user_agent(user_agent: str) -> str:
+    for agent_class, pattern in _AGENT_PATTERNS:
+        if pattern.search(user_agent):
+            return agent_class
+    return "other"
+
+
+class ScanRecorder:
+    def __init__(self, path, capacity=100000, flush_interval=1.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._buffer = deque(maxlen=capacity)  # (code, timestamp, agent class); appends are thread-safe
+        self._db = sqlite_db.Database(path, SCHEMA)
+        self._flush_lock = threading.Lock()
+        self._flusher_pid = None
+        atexit.register(self.flush)
+
+    def _connect(self):
+        return self._db.connect()
+
+    def record(self, code, user_agent=""):
+        """Queue one scan; never touches the disk."""
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped += 1
+        self._buffer.append((code, time.time(), classify_user_agent(user_agent)))
+        if self._flusher_pid != os.getpid():
+            self._start_flusher()
+
+    def pending(self) -> int:
+        return len(self._buffer)
+
+    # --- Write-behind ---
+    def _start_flusher(self):
+        # Once per process: forked workers start their own
+        with self._flush_lock:
+            if self._flusher_pid != os.getpid():
+                self._flusher_pid = os.getpid()
+                threading.Thread(target=self._flush_loop, name="qrgen-scans", daemon=True).start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                print(f"Error writing scans: {e}")
+
+    def flush(self) -> int:
+        """Write every queued scan in one transaction; returns how many were written."""
+        with self._flush_lock:
+            batch = []
+            popleft = self._buffer.popleft
+            try:
+                while True:
+                    batch.append(popleft())
+            except IndexError:
+                pass
+            if batch:
+                try:
+                    with self._connect() as db:
+                        db.executemany("INSERT INTO scans (code, scanned_at, agent) VALUES (?, ?, ?)", batch)
+                except sqlite3.Error:
+                    self._buffer.extendleft(reversed(batch))  # keep them for the next flush
+                    raise
+            return len(batch)
+
+    # --- Queries ---
+    def counts(self, code=None, since=None, until=None) -> list:
+        """Per-code totals with a breakdown by agent class, most scanned first."""
+        where, args = [], []
+        if code:
+            where.append("code = ?")
+            args.append(code)
+        if since is not None:
+            where.append("scanned_at >= ?")
+            args.append(since)
+        if until is not None:
+            where.append("scanned_at < ?")
+            args.append(until)
+        sql = "SELECT code, agent, COUNT(*), MIN(scanned_at), MAX(scanned_at) FROM scans"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        rows = self._connect().execute(sql + " GROUP BY code, agent", args).fetchall()
+
+        totals = {}
+        for row_code, agent, count, first, last in rows:
+            entry = totals.setdefault(row_code, {
+                "code": row_code, "total": 0, "agents": dict.fromkeys(AGENT_CLASSES, 0),
+                "first_scan": first, "last_scan": last,
+            })
+            entry["total"] += count
+            entry["agents"][agent] = count
+            entry["first_scan"] = min(entry["first_scan"], first)
+            entry["last_scan"] = max(entry["last_scan"], last)
+        return sorted(totals.values(), key=lambda entry: -entry["total"])
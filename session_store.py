@@ -0,0 +1,116 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import sqlite_db
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS sessions (sid TEXT PRIMARY KEY, state TEXT NOT NULL, expires_at REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS sessions_expires ON sessions (expires_at)",
+)
+
+
+class MemorySessionStore:
+    """Per-process session state: thread-safe, TTL-expired and bounded to max_entries (LRU)."""
+
+    def __init__(self, ttl=3600, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # sid -> (expires_at, state)
+        self._lock = threading.Lock()
+
+    def get(self, sid):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(sid)
+            if entry is None:
+                return None
+            expires_at, state = entry
+            if expires_at <= now:
+                del self._entries[sid]
+                return None
+            self._entries.move_to_end(sid)
+            return state
+
+    def set(self, sid, state: dict):
+        now = time.monotonic()
+        with self._lock:
+            self._entries[sid] = (now + self.ttl, state)
+            self._entries.move_to_end(sid)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            # Least-recently-used entries sit at the front, so expired ones are cheap to sweep from there
+            while self._entries:
+                oldest_sid, (expires_at, _) = next(iter(self._entries.items()))
+                if expires_at > now:
+                    break
+                del self._entries[oldest_sid]
+
+    def delete(self, sid):
+        with self._lock:
+            self._entries.pop(sid, None)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class SqliteSessionStore:
+    """Session state in a SQLite file, shared by every worker process; same interface as MemorySessionStore."""
+
+    PURGE_EVERY = 256
+
+    def __init__(self, path, ttl=3600, max_entries=100000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._db = sqlite_db.Database(path, SCHEMA)
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+
+    def _connect(self):
+        return self._db.connect()
+
+    def get(self, sid):
+        row = self._connect().execute(
+            "SELECT state FROM sessions WHERE sid = ? AND expires_at > ?", (sid, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, sid, state: dict):
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO sessions (sid, state, expires_at) VALUES (?, ?, ?)",
+                (sid, json.dumps(state), time.time() + self.ttl),
+            )
+        with self._writes_lock:
+            self._writes += 1
+            purge = self._writes % self.PURGE_EVERY == 0
+        if purge:
+            self.purge()
+
+    def delete(self, sid):
+        with self._connect() as db:
+            db.execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+
+    def purge(self):
+        with self._connect() as db:
+            db.execute("DELETE FROM sessions WHERE expires_at <= ?", (time.time(),))
+            # Enforce the memory bound by dropping the sessions closest to expiry
+            db.execute(
+                "DELETE FROM sessions WHERE sid IN ("
+                " SELECT sid FROM sessions ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+def open_store(path="", ttl=3600, max_entries=10000):
+    """SQLite-backed store when path is set (needed for multi-process servers), in-memory otherwise."""
+    if path:
+        return SqliteSessionStore(path, ttl=ttl, max_entries=max_entries)
+    return MemorySessionStore(ttl=ttl, max_entries=max_entries)
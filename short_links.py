@@ -0,0 +1,95 @@
+import secrets
+import sqlite3
+import threading
+import time
+import urllib.parse
+from collections import OrderedDict
+
+import sqlite_db
+
+# Crockford base32: digits and upper-case letters only, so a short URL written in upper case fits the
+# QR alphanumeric mode; I, L, O and U are left out to keep codes readable when typed by hand
+CODE_ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+CODE_LENGTH = 7
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS short_links ("
+    " code TEXT PRIMARY KEY, target TEXT NOT NULL,"
+    " created_at REAL NOT NULL, updated_at REAL NOT NULL)",
+)
+
+
+def new_code(length=CODE_LENGTH):
+    return "".join(secrets.choice(CODE_ALPHABET) for _ in range(length))
+
+
+def short_url(base, code):
+    """base + "R/" + code, with the scheme and host upper-cased (both are case-insensitive) so the whole
+    URL can be encoded in alphanumeric mode when base has no path."""
+    parts = urllib.parse.urlsplit(base)
+    path = parts.path.rstrip("/")
+    return f"{parts.scheme.upper()}://{parts.netloc.upper()}{path}/R/{code}"
+
+
+class ShortLinkStore:
+    """Short code -> landing URL in a SQLite file shared by every worker process.
+
+    Lookups go through an in-process LRU; entries expire after cache_ttl seconds so an edit made by
+    another worker is picked up without any cross-process invalidation.
+    """
+
+    def __init__(self, path, cache_entries=4096, cache_ttl=30):
+        self.path = path
+        self.cache_entries = cache_entries
+        self.cache_ttl = cache_ttl
+        self._cache = OrderedDict()  # code -> (expires_at, target)
+        self._cache_lock = threading.Lock()
+        self._db = sqlite_db.Database(path, SCHEMA)
+
+    def _connect(self):
+        return self._db.connect()
+
+    def _remember(self, code, target):
+        with self._cache_lock:
+            self._cache[code] = (time.monotonic() + self.cache_ttl, target)
+            self._cache.move_to_end(code)
+            while len(self._cache) > self.cache_entries:
+                self._cache.popitem(last=False)
+
+    def create(self, target) -> str:
+        now = time.time()
+        while True:
+            code = new_code()
+            try:
+                with self._connect() as db:
+                    db.execute(
+                        "INSERT INTO short_links (code, target, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                        (code, target, now, now),
+                    )
+            except sqlite3.IntegrityError:
+                continue  # code already taken
+            self._remember(code, target)
+            return code
+
+    def update(self, code, target) -> bool:
+        """Point an existing code at a new target; False when the code does not exist."""
+        with self._connect() as db:
+            updated = db.execute(
+                "UPDATE short_links SET target = ?, updated_at = ? WHERE code = ?", (target, time.time(), code)
+            ).rowcount
+        if updated:
+            self._remember(code, target)
+        return bool(updated)
+
+    def resolve(self, code):
+        code = code.upper()
+        now = time.monotonic()
+        with self._cache_lock:
+            entry = self._cache.get(code)
+            if entry is not None and entry[0] > now:
+                self._cache.move_to_end(code)
+                return entry[1]
+        row = self._connect().execute("SELECT target FROM short_links WHERE code = ?", (code,)).fetchone()
+        if row is None:
+            return None
+        self._remember(code, row[0])
+        return row[0]
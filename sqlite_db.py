@@ -0,0 +1,47 @@
+"""Shared SQLite plumbing for the stores that keep state in a local database file.
+
+Connections are per thread (sqlite3 connections must not be shared across threads) and per process (a
+forked worker opens its own), and are shared by every store on the same file. Each store's schema is
+created once, on first use, so an unused store leaves no file behind.
+"""
+import os
+import sqlite3
+import threading
+
+_local = threading.local()
+
+
+def connection(path) -> sqlite3.Connection:
+    """This thread's connection to the database at path."""
+    connections = getattr(_local, "connections", None)
+    if connections is None or _local.pid != os.getpid():
+        connections = _local.connections = {}
+        _local.pid = os.getpid()
+    db = connections.get(path)
+    if db is None:
+        db = sqlite3.connect(path, timeout=10)
+        db.execute("PRAGMA synchronous=NORMAL")
+        connections[path] = db
+    return db
+
+
+class Database:
+    """A store's view of one SQLite file: connect() also makes sure its tables exist (WAL mode)."""
+
+    def __init__(self, path, schema):
+        self.path = path
+        self.schema = schema  # CREATE ... IF NOT EXISTS statements
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def connect(self) -> sqlite3.Connection:
+        db = connection(self.path)
+        if not self._schema_ready:
+            with self._schema_lock:
+                if not self._schema_ready:
+                    with db:
+                        db.execute("PRAGMA journal_mode=WAL")
+                        for statement in self.schema:
+                            db.execute(statement)
+                    self._schema_ready = True
+        return db
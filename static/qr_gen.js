@@ -0,0 +1,275 @@
+/* ---------- Platform blocks ---------- */
+let shown = 1;
+function showNext() {
+    document.getElementById("block1").classList.remove("hidden");
+    document.getElementById("block2").classList.remove("hidden");
+    document.getElementById("block3").classList.remove("hidden");
+    shown = 3;
+}
+function deleteBackgroundImage() {
+    document.getElementById('modalBgImage').value = ''; // Clear file input
+    document.getElementById('deleteBg').value = '1'; // Signal server to remove
+    const form = document.getElementById('qrForm');
+    const deleteHidden = document.getElementById('deleteBg');
+    form.appendChild(deleteHidden);
+    form.submit(); // Regenerate QR
+}
+
+/* ---------- Platform URL HANDLING ---------- */
+const PLATFORM_BASES={
+    facebook:'https://www.facebook.com/',
+    instagram:'https://www.instagram.com/',
+    youtube:'https://www.youtube.com/@',
+    linkedin:'https://www.linkedin.com/in/',
+    whatsapp:'https://wa.me/',
+    drive:'https://drive.google.com/open?id=',
+    googleform:'https://docs.google.com/forms/d/',
+    tel:'tel:',
+    sms:'sms:',
+    mailto:'mailto:',
+    '': ''
+};
+
+function create(platform, username){
+    if(!platform || !username) return "";
+    if(platform === 'other') return username; // for other, username is the full link
+    let base = PLATFORM_BASES[platform];
+    if(platform==='googleform'){
+        return base + username + '/viewform';
+    }
+    if(platform==='youtube'){
+        username = username.startsWith('@') ? username.substring(1) : username;
+    }
+    // Clean phone entries for whatsapp/tel/sms
+    if(platform==='whatsapp' || platform==='tel' || platform==='sms'){
+        username = username.replace(/[^0-9+]/g,'');
+    }
+    return base + username;
+}
+
+function updateLink1(){
+    document.getElementById("finalLink1").value =
+        create(document.getElementById("platform1").value, document.getElementById("username1").value.trim());
+}
+function updateLink2(){
+    document.getElementById("finalLink2").value =
+        create(document.getElementById("platform2").value, document.getElementById("username2").value.trim());
+}
+function updateLink3(){
+    document.getElementById("finalLink3").value =
+        create(document.getElementById("platform3").value, document.getElementById("username3").value.trim());
+}
+
+/* ---------- Label dropdown logic (main form) ---------- */
+function onLabelPresetChange(){
+    const sel = document.getElementById('labelPreset');
+    const customInput = document.getElementById('customLabelInput');
+    const hiddenField = document.getElementById('custom_text');
+
+    if(sel.value === 'Custom'){
+        customInput.classList.remove('hidden');
+        hiddenField.value = customInput.value || "";
+    } else {
+        customInput.classList.add('hidden');
+        hiddenField.value = sel.value;
+    }
+}
+document.getElementById('customLabelInput').addEventListener('input', function(){
+    document.getElementById('custom_text').value = this.value;
+});
+
+/* Initialize label fields from server-provided value */
+(function initLabelFromServer(){
+    try {
+        const serverVal = document.getElementById('custom_text').value.trim();
+        if(serverVal && serverVal !== 'None'){
+            // if matches a preset, select that preset; else choose Custom and populate
+            const presets = ['Scan Me!','Visit My Profile','Contact Me'];
+            if(presets.includes(serverVal)){
+                document.getElementById('labelPreset').value = serverVal;
+                document.getElementById('customLabelInput').classList.add('hidden');
+                document.getElementById('custom_text').value = serverVal;
+            } else {
+                document.getElementById('labelPreset').value = 'Custom';
+                document.getElementById('customLabelInput').classList.remove('hidden');
+                document.getElementById('customLabelInput').value = serverVal;
+                document.getElementById('custom_text').value = serverVal;
+            }
+        }
+    } catch(e){}
+})();
+
+/* ---------- Add Platform Modal ---------- */
+function openAddPlatformModal(){
+    // optionally pre-populate from current? but probably clear them
+    const modalBackdrop = document.getElementById('addPlatformBackdrop');
+    modalBackdrop.style.display = 'flex';
+}
+
+function closeAddPlatformModal(){
+    const modalBackdrop = document.getElementById('addPlatformBackdrop');
+    modalBackdrop.style.display = 'none';
+}
+
+/* Apply add platform settings */
+function applyAddPlatform(){
+    // set the form fields from modal
+    document.getElementById('platform1').value = document.getElementById('modalPlatform1').value;
+    document.getElementById('username1').value = document.getElementById('modalUsername1').value;
+    document.getElementById('platform2').value = document.getElementById('modalPlatform2').value;
+    document.getElementById('username2').value = document.getElementById('modalUsername2').value;
+    document.getElementById('platform3').value = document.getElementById('modalPlatform3').value;
+    document.getElementById('username3').value = document.getElementById('modalUsername3').value;
+
+    // update the hidden links
+    updateLink1();
+    updateLink2();
+    updateLink3();
+
+    // show preview of added links as platform buttons
+    const linksList = document.getElementById('linksList');
+    linksList.innerHTML = '';
+    const platforms = [
+        {plat: document.getElementById('platform1').value, user: document.getElementById('username1').value, link: document.getElementById('finalLink1').value, label: 'Platform 1'},
+        {plat: document.getElementById('platform2').value, user: document.getElementById('username2').value, link: document.getElementById('finalLink2').value, label: 'Platform 2'},
+        {plat: document.getElementById('platform3').value, user: document.getElementById('username3').value, link: document.getElementById('finalLink3').value, label: 'Platform 3'}
+    ];
+
+    const PLATFORM_BUTTON_STYLES = {
+        facebook: 'bg-blue-600 hover:bg-blue-700 text-white',
+        instagram: 'bg-pink-600 hover:bg-pink-700 text-white',
+        youtube: 'bg-red-600 hover:bg-red-700 text-white',
+        linkedin: 'bg-blue-700 hover:bg-blue-800 text-white',
+        whatsapp: 'bg-green-600 hover:bg-green-700 text-white',
+        tel: 'bg-green-700 hover:bg-green-800 text-white',
+        sms: 'bg-yellow-600 hover:bg-yellow-700 text-white',
+        mailto: 'bg-red-600 hover:bg-red-700 text-white',
+        other: 'bg-indigo-600 hover:bg-indigo-700 text-white',
+        default: 'bg-gray-600 hover:bg-gray-700 text-white'
+    };
+
+    const PLATFORM_ICONS = {
+        facebook: '<i class="fab fa-facebook-f"></i>',
+        instagram: '<i class="fab fa-instagram"></i>',
+        youtube: '<i class="fab fa-youtube"></i>',
+        linkedin: '<i class="fab fa-linkedin-in"></i>',
+        whatsapp: '<i class="fab fa-whatsapp"></i>',
+        tel: '<i class="fa-solid fa-phone"></i>',
+        sms: '<i class="fa-solid fa-message"></i>',
+        mailto: '<i class="fa-solid fa-envelope"></i>',
+        other: '<i class="fa-solid fa-link"></i>',
+        default: '<i class="fa-solid fa-globe"></i>'
+    };
+
+    platforms.forEach((p, idx) => {
+        if(p.plat && p.user && p.link){
+            const button = document.createElement('button');
+            const styleKey = p.plat in PLATFORM_BUTTON_STYLES ? p.plat : 'default';
+            const icon = PLATFORM_ICONS[styleKey];
+            const name = p.plat === 'tel' ? 'Call' : p.plat === 'sms' ? 'Text' : p.plat === 'mailto' ? 'Email' : p.plat === 'other' ? 'Custom' : p.plat.charAt(0).toUpperCase() + p.plat.slice(1);
+
+            button.innerHTML = `${icon} ${name}`;
+            button.className = `m-1 px-3 py-2 rounded-md text-sm font-medium transition ${PLATFORM_BUTTON_STYLES[styleKey]}`;
+            button.onclick = () => window.open(p.link, '_blank');
+            linksList.appendChild(button);
+        }
+    });
+    document.getElementById('linksPreview').style.display = 'block';
+
+    // close modal
+    closeAddPlatformModal();
+}
+
+/* ---------- Modal & three-dots ---------- */
+const threeDots = document.getElementById('threeDots');
+const modalBackdrop = document.getElementById('modalBackdrop');
+
+threeDots && threeDots.addEventListener('click', function(){
+    // sync modal inputs with current form values
+    const curLabel = document.getElementById('custom_text').value || 'Scan Me!';
+    const presetOptions = ['Scan Me!','Visit My Profile','Contact Me'];
+    const modalPreset = document.getElementById('modalLabelPreset');
+    if(presetOptions.includes(curLabel)){
+        modalPreset.value = curLabel;
+        document.getElementById('modalCustomLabel').classList.add('hidden');
+    } else {
+        modalPreset.value = 'Custom';
+        document.getElementById('modalCustomLabel').classList.remove('hidden');
+        document.getElementById('modalCustomLabel').value = curLabel;
+    }
+    // populate box size from hidden field or default
+    const boxField = document.getElementById('box_size_field').value;
+    document.getElementById('modalBoxSize').value = boxField ? boxField : 5;
+    // error level
+    const errField = document.getElementById('error_level_field').value || 'L';
+    document.getElementById('modalErrorLevel').value = errField;
+
+    modalBackdrop.style.display = 'flex';
+});
+
+function closeModal(){ modalBackdrop.style.display = 'none'; }
+
+function onModalLabelPresetChange(){
+    const sel = document.getElementById('modalLabelPreset');
+    const cust = document.getElementById('modalCustomLabel');
+    if(sel.value === 'Custom') cust.classList.remove('hidden');
+    else cust.classList.add('hidden');
+}
+document.getElementById('modalLabelPreset').addEventListener('change', onModalLabelPresetChange);
+
+/* Apply modal settings to the form and submit */
+function applyModalSettings(){
+    // label
+    const modalPreset = document.getElementById('modalLabelPreset').value;
+    const modalCustom = document.getElementById('modalCustomLabel').value || '';
+    if(modalPreset === 'Custom'){
+        document.getElementById('labelPreset').value = 'Custom';
+        document.getElementById('customLabelInput').classList.remove('hidden');
+        document.getElementById('customLabelInput').value = modalCustom;
+        document.getElementById('custom_text').value = modalCustom;
+    } else {
+        document.getElementById('labelPreset').value = modalPreset;
+        document.getElementById('customLabelInput').classList.add('hidden');
+        document.getElementById('custom_text').value = modalPreset;
+    }
+
+    // box size & error
+    const boxVal = parseInt(document.getElementById('modalBoxSize').value) || 5;
+    document.getElementById('box_size_field').value = boxVal;
+
+    const errVal = document.getElementById('modalErrorLevel').value || 'L';
+    document.getElementById('error_level_field').value = errVal;
+
+    // append file input if file is selected
+    const form = document.getElementById('qrForm');
+    const fileInput = document.getElementById('modalBgImage');
+    const deleteHidden = document.getElementById('deleteBg');
+    if (fileInput.files.length > 0) {
+        form.appendChild(fileInput);
+    }
+    if (deleteHidden.value === '1') {
+        form.appendChild(deleteHidden);
+    }
+
+    // close modal and submit form to regenerate QR
+    modalBackdrop.style.display = 'none';
+    form.submit();
+}
+
+/* modal custom label input listener */
+document.getElementById('modalCustomLabel').addEventListener('input', function(){
+    // live sync not necessary; will apply on Apply
+});
+
+/* ---------- keep link inputs updated on submit (just in case) ---------- */
+document.getElementById('qrForm').addEventListener('submit', function(){
+    updateLink1(); updateLink2(); updateLink3();  
+    // ensure custom_text field populated if customLabelInput visible
+    const preset = document.getElementById('labelPreset').value;
+    if(preset === 'Custom'){
+        document.getElementById('custom_text').value = document.getElementById('customLabelInput').value || '';
+    } else {
+        document.getElementById('custom_text').value = preset;
+    }
+});
+
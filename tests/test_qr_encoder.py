@@ -0,0 +1,124 @@
+"""qr_encoder against the stock qrcode encoder it replaces.
+
+    python -m pytest tests
+"""
+import os
+import random
+import sys
+
+import pytest
+import qrcode
+from qrcode import util as qrcode_util
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import qr_encoder  # noqa: E402
+
+ERROR_LEVELS = (
+    qrcode.constants.ERROR_CORRECT_L,
+    qrcode.constants.ERROR_CORRECT_M,
+    qrcode.constants.ERROR_CORRECT_Q,
+    qrcode.constants.ERROR_CORRECT_H,
+)
+_ALPHABETS = (
+    b"0123456789",
+    qrcode_util.ALPHA_NUM,
+    b"abcdefghijklmnopqrstuvwxyz0123456789-_.~/?=&%",
+    bytes(range(256)),
+)
+
+
+def _payload(rng, length):
+    """Runs drawn from numeric, alphanumeric, URL-ish and arbitrary bytes, so every mode switch occurs."""
+    out = bytearray()
+    while len(out) < length:
+        alphabet = rng.choice(_ALPHABETS)
+        out.extend(rng.choice(alphabet) for _ in range(rng.randint(1, 30)))
+    return bytes(out[:length])
+
+
+def _cases(count, seed=1):
+    rng = random.Random(seed)
+    return [(_payload(rng, rng.randint(1, 300)), rng.choice(ERROR_LEVELS)) for _ in range(count)]
+
+
+def _segment_bits(segments, version):
+    sizes = qrcode_util.mode_sizes_for_version(version)
+    return sum(4 + sizes[segment.mode] + qr_encoder._segment_bits(segment) for segment in segments)
+
+
+def _stock_qr(segments, version, error_level, mask=None):
+    qr = qrcode.QRCode(version=version, error_correction=error_level, mask_pattern=mask)
+    for segment in segments:
+        qr.add_data(segment)
+    qr.make(fit=version is None)
+    return qr
+
+
+def _ours(segments, version, error_level, mask=None):
+    qr = qr_encoder.QRCode(version=version, error_correction=error_level, mask_pattern=mask)
+    for segment in segments:
+        qr.add_data(segment)
+    qr.make(fit=version is None)
+    return qr
+
+
+def _modules(qr):
+    return [[bool(module) for module in row] for row in qr.modules]
+
+
+# --- Symbols ---
+@pytest.mark.parametrize("data,error_level", _cases(40))
+def test_matrix_matches_stock_qrcode(data, error_level):
+    segments = qr_encoder.optimal_segments(data, 40)
+    stock = _stock_qr(segments, None, error_level)
+    ours = _ours(segments, None, error_level)
+    assert ours.version == stock.version
+    assert _modules(ours) == _modules(stock)
+
+
+@pytest.mark.parametrize("mask", qr_encoder.MASK_PATTERNS)
+def test_pinned_mask_matches_stock_qrcode(mask):
+    for data, error_level in _cases(5, seed=mask):
+        segments = qr_encoder.optimal_segments(data, 40)
+        version = _stock_qr(segments, None, error_level).version
+        assert _modules(_ours(segments, version, error_level, mask)) == \
+            _modules(_stock_qr(segments, version, error_level, mask))
+
+
+@pytest.mark.parametrize("data,error_level", _cases(20, seed=2))
+def test_codewords_match_stock_qrcode(data, error_level):
+    segments = qr_encoder.optimal_segments(data, 40)
+    version = _stock_qr(segments, None, error_level).version
+    assert qr_encoder.encode_data(version, error_level, segments) == \
+        bytes(qrcode_util.create_data(version, error_level, list(segments)))
+
+
+# --- Segmentation ---
+@pytest.mark.parametrize("data,error_level", _cases(60, seed=3))
+def test_optimal_segments_round_trip(data, error_level):
+    for version in (1, 10, 27):
+        segments = qr_encoder.optimal_segments(data, version)
+        assert b"".join(segment.data for segment in segments) == data
+        for segment in segments:
+            if segment.mode == qrcode_util.MODE_NUMBER:
+                assert segment.data.isdigit()
+            elif segment.mode == qrcode_util.MODE_ALPHA_NUM:
+                assert set(segment.data) <= set(qrcode_util.ALPHA_NUM)
+        # Never longer than qrcode's own segmentation of the same bytes
+        stock = list(qrcode_util.optimal_data_chunks(data))
+        assert _segment_bits(segments, version) <= _segment_bits(stock, version)
+
+
+@pytest.mark.parametrize("data,error_level", _cases(30, seed=4))
+def test_text_payload_fits_its_version(data, error_level):
+    qr = qr_encoder.QRCode(error_correction=error_level)
+    qr.add_data(data)
+    qr.make()
+    segments = qr.segments(qr.version)
+    assert b"".join(segment.data for segment in segments) == data
+    limits = qrcode_util.BIT_LIMIT_TABLE[error_level]
+    assert _segment_bits(segments, qr.version) <= limits[qr.version]
+    if qr.version > 1:
+        smaller = qr.segments(qr.version - 1)
+        assert _segment_bits(smaller, qr.version - 1) > limits[qr.version - 1]
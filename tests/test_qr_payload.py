@@ -0,0 +1,124 @@
+"""qr_payload: round trips, malformed input, and the landing pages' copies of its tables.
+
+    python -m pytest tests
+"""
+import base64
+import os
+import re
+import sys
+import zlib
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import qr_payload  # noqa: E402
+
+LANDING_PAGES = ("my_detailc.html", "qrdetail.html")
+
+
+def _header(value):
+    return base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))[0]
+
+
+def _pack(header, body):
+    return base64.urlsafe_b64encode(bytes((header,)) + body).rstrip(b"=").decode("ascii")
+
+
+# --- Round trips ---
+@pytest.mark.parametrize("prefix", qr_payload.PREFIXES)
+def test_prefixed_links_round_trip(prefix):
+    params = {"name": "Someone", "l1": prefix + "someone", "img": prefix + "a/b.png"}
+    assert qr_payload.decode(qr_payload.encode(params)) == params
+
+
+def test_longest_prefix_is_used():
+    value = qr_payload.encode({"l1": "https://www.instagram.com/someone"})
+    body = base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))[1:]
+    assert body[1] == qr_payload.PREFIXES.index("https://www.instagram.com/")
+
+
+def test_unicode_round_trip():
+    params = {
+        "name": "Zoë Ångström 李小龍",
+        "msg": "Grüße 👋 — écrivez-moi !",
+        "copy": "עברית / العربية",
+        "key": "ключ",
+        "l2": "https://例え.jp/パス?q=ü",
+    }
+    assert qr_payload.decode(qr_payload.encode(params)) == params
+
+
+def test_every_field_round_trips():
+    params = {field: f"{field}-value" for field in qr_payload.FIELDS}
+    assert qr_payload.decode(qr_payload.encode(params)) == params
+
+
+def test_empty_fields_are_dropped():
+    assert qr_payload.decode(qr_payload.encode({"name": "A", "msg": "", "l1": None})) == {"name": "A"}
+    assert qr_payload.decode(qr_payload.encode({})) == {}
+
+
+def test_long_field_lengths_use_several_varint_bytes():
+    params = {"msg": "x" * 20000, "name": "y" * 200}
+    assert qr_payload.decode(qr_payload.encode(params)) == params
+
+
+def test_short_payload_is_stored_raw():
+    value = qr_payload.encode({"name": "A"})
+    assert _header(value) == qr_payload.VERSION
+    assert qr_payload.decode(value) == {"name": "A"}
+
+
+def test_repetitive_payload_is_deflated():
+    params = {"msg": "Check out my profile! " * 20, "l1": "https://github.com/someone"}
+    value = qr_payload.encode(params)
+    assert _header(value) == qr_payload.VERSION | qr_payload.DEFLATED
+    assert qr_payload.decode(value) == params
+
+
+# --- Malformed input ---
+@pytest.mark.parametrize("value", [
+    "",
+    "A",  # not valid base64
+    _pack(2, b"\x01\x01a"),  # unknown version
+    _pack(qr_payload.VERSION | qr_payload.DEFLATED, b"\xff\xfe not deflate"),
+    _pack(qr_payload.VERSION, b""),  # no field bitmap
+    _pack(qr_payload.VERSION, b"\x01\x05ab"),  # shorter than its length
+    _pack(qr_payload.VERSION, b"\x01\x80"),  # length varint cut off
+    _pack(qr_payload.VERSION, b"\x04\xff\x01a"),  # prefix index past PREFIXES
+    _pack(qr_payload.VERSION, b"\x01\x02\xff\xfe"),  # not UTF-8
+])
+def test_malformed_payload_raises_value_error(value):
+    with pytest.raises(ValueError):
+        qr_payload.decode(value)
+
+
+def test_truncated_payload_raises_value_error():
+    value = qr_payload.encode({"name": "Someone", "msg": "Hello there"})
+    raw = base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+    with pytest.raises(ValueError):
+        qr_payload.decode(_pack(raw[0], raw[1:-3]))
+
+
+def test_deflated_body_is_decoded_with_raw_deflate():
+    compressor = zlib.compressobj(9, zlib.DEFLATED, -15)
+    body = compressor.compress(b"\x01\x02Hi") + compressor.flush()
+    assert qr_payload.decode(_pack(qr_payload.VERSION | qr_payload.DEFLATED, body)) == {"name": "Hi"}
+
+
+# --- Landing pages ---
+def _js_string_array(html, name):
+    match = re.search(r"const " + name + r" = \[(.*?)\];", html, re.S)
+    assert match, f"{name} not found"
+    return tuple(re.findall(r"'((?:[^'\\]|\\.)*)'", match.group(1)))
+
+
+@pytest.mark.parametrize("page", LANDING_PAGES)
+def test_landing_page_tables_match(page):
+    with open(os.path.join(ROOT, page), encoding="utf-8") as f:
+        html = f.read()
+    assert _js_string_array(html, "PAYLOAD_PREFIXES") == qr_payload.PREFIXES
+    assert _js_string_array(html, "PAYLOAD_FIELDS") == qr_payload.FIELDS
+    assert set(_js_string_array(html, "PAYLOAD_PREFIXED")) == qr_payload.PREFIXED
@@ -0,0 +1,39 @@
+import zipfile
+
+
+class _ChunkSink:
+    # Write-only, non-seekable file object: zipfile falls back to data descriptors and we drain
+    # whatever it wrote after each entry, so at most one entry's compressed bytes are buffered.
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_zip(entries, compresslevel=6):
+    """Stream a ZIP archive from a lazy iterable of (arcname, data) pairs.
+
+    Each entry is deflated and handed out before the next one is pulled from entries.
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=compresslevel) as zf:
+        for arcname, data in entries:
+            with zf.open(arcname, "w") as dest:
+                dest.write(data)
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    # Central directory
+    chunk = sink.drain()
+    if chunk:
+        yield chunk